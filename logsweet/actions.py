@@ -5,13 +5,244 @@ This module contains the functionality to trigger actions
 according to the match of regular expression.
 """
 
-from typing import Any, Mapping, Tuple
+from typing import Any, Mapping, Optional, Tuple
 import re
 from string import Template
+from threading import Lock, BoundedSemaphore
+from time import monotonic
+from requests.adapters import HTTPAdapter
 from requests_futures.sessions import FuturesSession
+from .patterns import required_literal
 
+OVERFLOW_POLICIES = ('drop', 'block')
 
-session = FuturesSession()
+
+class RateLimiter(object):
+    """
+    A token bucket, allowing a number of events per second
+    with short bursts.
+
+    :param rate:
+        The number of events per second.
+    :type rate: float
+
+    :param burst:
+        The maximum number of events in a burst.
+        If `None` defaults to the rate, but at least 1.
+    :type burst: Optional[float]
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self._rate = rate
+        self._burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self._burst
+        self._last = monotonic()
+        self._lock = Lock()
+
+    def acquire(self) -> bool:
+        """
+        Takes a token from the bucket if possible.
+
+        :return: `True` if the event is allowed; otherwise `False`.
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self._burst,
+                               self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+class ActionDispatcher(object):
+    """
+    Sends the HTTP requests of action rules asynchronously,
+    with a bounded number of queued and running requests.
+
+    Requests are executed by a pool of `concurrency` threads.
+    If `concurrency + queue_size` requests are pending,
+    new requests are dropped or block the caller, depending on `overflow`.
+    Requests for an URL, which was requested less than `coalesce` seconds
+    ago, are coalesced into the earlier request.
+
+    The attributes `sent`, `failed`, `dropped`, and `coalesced`
+    count the requests which succeeded, failed, were dropped
+    because of the overflow policy or a rate limit,
+    and were coalesced.
+
+    :param concurrency:
+        The maximum number of concurrently running requests.
+    :type concurrency: int
+
+    :param queue_size:
+        The maximum number of requests waiting for a free thread.
+    :type queue_size: int
+
+    :param pool_size:
+        The maximum number of connections kept open per host.
+        If `None` defaults to `concurrency`.
+    :type pool_size: Optional[int]
+
+    :param overflow:
+        ``drop`` to drop requests if the queue is full,
+        or ``block`` to wait for a free place in the queue.
+    :type overflow: str
+
+    :param coalesce:
+        The time window in seconds for coalescing requests
+        of the same URL. ``0`` disables coalescing.
+    :type coalesce: float
+
+    :param session:
+        An existing session object with a method
+        ``get(url, timeout=...)`` returning a future.
+        If `None` a :py:class:`requests_futures.sessions.FuturesSession`
+        is created.
+    :type session: Optional[Any]
+    """
+
+    def __init__(self, concurrency: int = 4,
+                 queue_size: int = 100,
+                 pool_size: Optional[int] = None,
+                 overflow: str = 'drop',
+                 coalesce: float = 0.0,
+                 session: Optional[Any] = None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unsupported overflow policy: " + str(overflow))
+        concurrency = max(1, concurrency)
+        if session is None:
+            session = FuturesSession(max_workers=concurrency)
+            pool_size = pool_size or concurrency
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self._session = session
+        self._slots = BoundedSemaphore(concurrency + max(0, queue_size))
+        self._block = overflow == 'block'
+        self._coalesce = coalesce
+        self._last_requests = {}
+        self._lock = Lock()
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_config(cls, config: Optional[Mapping[str, Any]]) \
+            -> 'ActionDispatcher':
+        """
+        Creates a dispatcher from a dict like structure
+        with the optional keys `concurrency`, `queue_size`, `pool_size`,
+        `overflow`, and `coalesce`.
+        """
+        config = config or {}
+        return cls(concurrency=int(config.get('concurrency', 4)),
+                   queue_size=int(config.get('queue_size', 100)),
+                   pool_size=config.get('pool_size'),
+                   overflow=str(config.get('overflow', 'drop')),
+                   coalesce=float(config.get('coalesce', 0.0)))
+
+    def _is_coalesced(self, url):
+        now = monotonic()
+        with self._lock:
+            last = self._last_requests.get(url)
+            if last is not None and now - last < self._coalesce:
+                self.coalesced += 1
+                return True
+            if len(self._last_requests) > 1000:
+                self._last_requests = {
+                    u: t for u, t in self._last_requests.items()
+                    if now - t < self._coalesce}
+            self._last_requests[url] = now
+            return False
+
+    def _done(self, future):
+        self._slots.release()
+        try:
+            response = future.result()
+            failed = response is not None and \
+                getattr(response, 'status_code', 200) >= 400
+        except Exception:
+            failed = True
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.sent += 1
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def dispatch(self, url: str, timeout: float,
+                 limiter: Optional[RateLimiter] = None) -> bool:
+        """
+        Enqueues a HTTP GET request.
+
+        :param url:
+            The URL to request.
+        :type url: str
+
+        :param timeout:
+            The timeout in seconds for the request.
+        :type timeout: float
+
+        :param limiter:
+            An optional rate limit for the request.
+        :type limiter: Optional[RateLimiter]
+
+        :return:
+            `True` if the request was enqueued;
+            `False` if it was coalesced or dropped.
+        """
+        if self._coalesce > 0 and self._is_coalesced(url):
+            return False
+        if limiter and not limiter.acquire():
+            self._drop()
+            return False
+        if not self._slots.acquire(blocking=self._block):
+            self._drop()
+            return False
+        try:
+            future = self._session.get(url, timeout=timeout)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self.failed += 1
+            return False
+        future.add_done_callback(self._done)
+        return True
+
+    def stats(self) -> Mapping[str, int]:
+        """
+        Returns the counters as a dict.
+        """
+        with self._lock:
+            return {'sent': self.sent, 'failed': self.failed,
+                    'dropped': self.dropped, 'coalesced': self.coalesced}
+
+    def close(self):
+        """
+        Waits for the pending requests and releases the session.
+        """
+        self._session.close()
+
+
+_default_dispatcher = None
+
+
+def default_dispatcher() -> ActionDispatcher:
+    """
+    Returns a shared dispatcher with the default settings,
+    used by action rules created without a dispatcher.
+    """
+    global _default_dispatcher
+    if _default_dispatcher is None:
+        _default_dispatcher = ActionDispatcher()
+    return _default_dispatcher
 
 
 class HttpActionRule(object):
@@ -23,27 +254,47 @@ class HttpActionRule(object):
         A dict like structure with the following keys:
         `pattern` with the regular expression,
         `url` with an URL to invoke,
-        and `timeout` with a timeout in seconds,
-        when to cancel the HTTP request.
+        `timeout` with a timeout in seconds,
+        when to cancel the HTTP request,
+        and optionally `rate_limit` with the maximum number
+        of requests per second triggered by this rule.
     :type config: Mapping[str, Any]
+
+    :param dispatcher:
+        The dispatcher to enqueue the HTTP requests into.
+        If `None` uses :py:func:`default_dispatcher`.
+    :type dispatcher: Optional[ActionDispatcher]
+
+    The attribute `literal` holds a string, which is contained in every
+    matching line, or `None`; see :py:class:`logsweet.patterns.RuleSet`.
     """
 
-    def __init__(self, config: Mapping[str, Any]):
+    def __init__(self, config: Mapping[str, Any],
+                 dispatcher: Optional[ActionDispatcher] = None):
         try:
             self._pattern = re.compile(str(config.get('pattern')))
         except Exception as e:
             print('Error in regular expression: ', str(e))
             self._pattern = None
+        self.literal = required_literal(self._pattern)
         self._url_template = Template(str(config.get('url')))
         try:
             self._timeout = float(config.get('timeout', 10.0))
         except Exception as e:
             print('Invalid timeout value: ', str(e))
             self._timeout = 10.0
+        self._limiter = None
+        if config.get('rate_limit') is not None:
+            try:
+                self._limiter = RateLimiter(float(config.get('rate_limit')))
+            except Exception as e:
+                print('Invalid rate limit value: ', str(e))
+        self._dispatcher = dispatcher
 
     def _trigger(self, line, match):
         url = self._url_template.safe_substitute(**match.groupdict())
-        session.get(url, timeout=self._timeout)
+        dispatcher = self._dispatcher or default_dispatcher()
+        dispatcher.dispatch(url, self._timeout, self._limiter)
 
     def process(self, line: str) -> Tuple[bool, str]:
         """
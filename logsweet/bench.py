@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains benchmarks for measuring the throughput
+and the latency of the components of `logsweet`.
+
+The results are returned as JSON compatible structures,
+so they can be stored and compared between releases.
+"""
+
+from typing import Any, Dict, Optional, Sequence
+import os
+import re
+import sys
+import socket
+import shutil
+import tempfile
+import platform
+from itertools import count
+from threading import Thread
+from time import perf_counter, sleep
+from . import __version__
+from .mock import random_log_message
+from .watch import LogWatcher
+from .core import LogWatcherHandler
+from .config import Configuration
+from .net import Broadcaster, Transmitter, Listener, ProxyDevice
+
+TRANSPORTS = ('inproc', 'tcp')
+SOCKETS = ('push', 'pub')
+SUITES = ('all', 'pipeline', 'micro')
+
+_CONFIG = """
+version: '0.1'
+exclude: DEBUG
+colors:
+  - pattern: '\\[ERROR\\]'
+    line: red
+  - pattern: '\\[WARNING\\]'
+    line: yellow
+  - pattern: '(?P<user>admin|operator)'
+    user: cyan
+"""
+
+
+_TIMESTAMP = re.compile(r'(\d+\.\d{6}) \d{4}-\d\d-\d\d \d\d:\d\d:\d\d ')
+
+
+def _percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    last = len(values) - 1
+    return {
+        'p50': values[int(round(0.5 * last))],
+        'p90': values[int(round(0.9 * last))],
+        'p99': values[int(round(0.99 * last))],
+        'max': values[last],
+    }
+
+
+def _free_tcp_address() -> str:
+    s = socket.socket()
+    try:
+        s.bind(('127.0.0.1', 0))
+        return '127.0.0.1:{}'.format(s.getsockname()[1])
+    finally:
+        s.close()
+
+
+_endpoint_ids = count()
+
+
+def _address(transport, name):
+    if transport == 'inproc':
+        return 'inproc://logsweet-bench-{}-{}'.format(
+            name, next(_endpoint_ids))
+    return _free_tcp_address()
+
+
+def _write_lines(file_name, lines, rate, start_n=0):
+    """
+    Appends random log messages, prefixed with the time of writing,
+    at the given rate in lines per second, or as fast as possible.
+    """
+    n = 0
+    start = perf_counter()
+    fd = os.open(file_name, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        while n < lines:
+            if rate > 0:
+                due = min(lines, int((perf_counter() - start) * rate) + 1)
+                if due <= n:
+                    sleep(0.001)
+                    continue
+            else:
+                due = min(lines, n + 1000)
+            now = perf_counter()
+            # one write per chunk, so readers rarely see incomplete lines
+            os.write(fd, ''.join(
+                '{:.6f} {}\n'.format(now, random_log_message(start_n + i))
+                for i in range(n, due)).encode('UTF-8'))
+            n = due
+    finally:
+        os.close(fd)
+
+
+def bench_pipeline(lines: int = 100000,
+                   rate: float = 0.0,
+                   transport: str = 'inproc',
+                   socket_type: str = 'push',
+                   proxy: bool = False,
+                   batch_size: int = 1,
+                   timeout: float = 60.0,
+                   idle_timeout: float = 2.0) -> Dict[str, Any]:
+    """
+    Measures the throughput and latency of lines from a growing log file
+    through :py:class:`logsweet.watch.LogWatcher`,
+    :py:class:`logsweet.core.LogWatcherHandler`,
+    :py:class:`logsweet.net.Transmitter` or
+    :py:class:`logsweet.net.Broadcaster`,
+    optionally a native :py:class:`logsweet.net.ProxyDevice`,
+    and :py:class:`logsweet.net.Listener`.
+
+    All components run in threads of the current process.
+
+    :param lines:
+        The number of lines to write.
+    :type lines: int
+
+    :param rate:
+        The number of lines per second to write,
+        or ``0`` for writing as fast as possible.
+    :type rate: float
+
+    :param transport:
+        ``inproc`` or ``tcp``.
+    :type transport: str
+
+    :param socket_type:
+        ``push`` for sending with a :py:class:`logsweet.net.Transmitter`,
+        or ``pub`` for sending with a :py:class:`logsweet.net.Broadcaster`.
+    :type socket_type: str
+
+    :param proxy:
+        If `True`, the messages are forwarded by a native proxy.
+    :type proxy: bool
+
+    :param batch_size:
+        The maximum number of lines per message.
+    :type batch_size: int
+
+    :param timeout:
+        The maximum time in seconds to wait for the lines.
+    :type timeout: float
+
+    :param idle_timeout:
+        The time in seconds to wait for more lines,
+        before giving up on lines which got lost.
+    :type idle_timeout: float
+
+    :return:
+        A dict with the number of received lines,
+        the lines per second, and the latency percentiles in milliseconds.
+    """
+    if transport not in TRANSPORTS:
+        raise ValueError("Unsupported transport: " + str(transport))
+    if socket_type not in SOCKETS:
+        raise ValueError("Unsupported socket type: " + str(socket_type))
+    directory = tempfile.mkdtemp(prefix='logsweet-bench-')
+    file_name = os.path.join(directory, 'bench.log')
+    open(file_name, 'w').close()
+
+    send_address = _address(transport, 'send')
+    listen_address = _address(transport, 'listen') if proxy else send_address
+    device = None
+    if proxy:
+        device = ProxyDevice(
+            bind_address=send_address if socket_type == 'push' else None,
+            connect_addresses=[send_address] if socket_type == 'pub' else None,
+            frontend_connect_addresses=[listen_address])
+    latencies = []
+    first_last = [None, None]
+
+    def handle_line(source, file_name, line):
+        now = perf_counter()
+        if first_last[0] is None:
+            first_last[0] = now
+        first_last[1] = now
+        match = _TIMESTAMP.match(line)
+        if not match:
+            # a part of a line, which was read while being written
+            return
+        latencies.append(now - float(match.group(1)))
+        if len(latencies) >= lines:
+            listener.stop()
+
+    direct_pub = socket_type == 'pub' and not proxy
+    listener = Listener(
+        handler=handle_line,
+        bind_address=None if direct_pub else listen_address,
+        connect_addresses=[send_address] if direct_pub else None,
+        interval=0.01)
+    bc = Broadcaster(send_address) if socket_type == 'pub' else None
+    tm = Transmitter([send_address]) if socket_type == 'push' else None
+    handler = LogWatcherHandler('bench', None, False, bc=bc, tm=tm,
+                                batch_size=batch_size)
+    watcher = LogWatcher(file_name, handler, backend='poll')
+
+    listen_thread = Thread(target=listener.listen, daemon=True)
+    watch_thread = Thread(target=watcher.watch, kwargs={'interval': 0.001},
+                          daemon=True)
+    try:
+        if device:
+            device.start()
+        listen_thread.start()
+        # give subscriptions and connections time to be established
+        sleep(0.5)
+        watch_thread.start()
+        start = perf_counter()
+        _write_lines(file_name, lines, rate)
+        # wait until all lines are received,
+        # or no more lines arrive, because a PUB socket dropped them
+        deadline = start + timeout
+        while listen_thread.is_alive() and perf_counter() < deadline:
+            last = first_last[1] or start
+            if perf_counter() - max(last, start) > idle_timeout:
+                break
+            listen_thread.join(0.05)
+        elapsed = (first_last[1] or perf_counter()) - start
+    finally:
+        listener.stop()
+        listen_thread.join()
+        watcher.stop()
+        watch_thread.join()
+        watcher.close()
+        handler.flush()
+        if device:
+            device.stop()
+        if bc:
+            bc.close()
+        if tm:
+            tm.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'name': 'pipeline',
+        'transport': transport,
+        'socket': socket_type,
+        'proxy': proxy,
+        'batch_size': batch_size,
+        'rate': rate,
+        'lines': lines,
+        'received': len(latencies),
+        'seconds': elapsed,
+        'lines_per_sec': len(latencies) / elapsed if elapsed > 0 else None,
+        'latency_ms': {k: v * 1000.0
+                       for k, v in _percentiles(latencies).items()},
+    }
+
+
+def _throughput(name, lines, seconds, **kwargs):
+    result = {'name': name, 'lines': lines, 'seconds': seconds,
+              'lines_per_sec': lines / seconds if seconds > 0 else None}
+    result.update(kwargs)
+    return result
+
+
+def bench_config(lines: int = 100000) -> Dict[str, Any]:
+    """
+    Measures :py:meth:`logsweet.config.Configuration.process`
+    with a filter and a few color rules.
+    """
+    fd, config_file = tempfile.mkstemp(suffix='.yml')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(_CONFIG)
+        config = Configuration(config_file)
+    finally:
+        os.remove(config_file)
+    messages = [random_log_message(n) for n in range(lines)]
+    start = perf_counter()
+    for message in messages:
+        config.process(message)
+    return _throughput('config_process', lines, perf_counter() - start)
+
+
+def bench_tail(lines: int = 100000,
+               tail_lines: int = 1000) -> Dict[str, Any]:
+    """
+    Measures reading the last lines of a file
+    with :py:meth:`logsweet.watch.LogWatcher._tail`.
+    """
+    directory = tempfile.mkdtemp(prefix='logsweet-bench-')
+    file_name = os.path.join(directory, 'bench.log')
+    try:
+        _write_lines(file_name, lines, 0)
+        watcher = LogWatcher(file_name, lambda f, ls: None, backend='poll')
+        try:
+            start = perf_counter()
+            result = watcher._tail(file_name, tail_lines)
+            seconds = perf_counter() - start
+        finally:
+            watcher.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return _throughput('tail', len(result), seconds,
+                       file_lines=lines, tail_lines=tail_lines)
+
+
+def bench_read_lines(lines: int = 100000,
+                     binary: bool = False) -> Dict[str, Any]:
+    """
+    Measures reading new lines from a file
+    with :py:meth:`logsweet.watch.LogWatcher._read_lines`.
+    """
+    directory = tempfile.mkdtemp(prefix='logsweet-bench-')
+    file_name = os.path.join(directory, 'bench.log')
+    count = [0]
+
+    def handle_lines(f, ls):
+        count[0] += len(ls)
+
+    try:
+        open(file_name, 'w').close()
+        watcher = LogWatcher(file_name, handle_lines, backend='poll',
+                             encoding='UTF-8', binary=binary)
+        try:
+            _write_lines(file_name, lines, 0)
+            file = next(iter(watcher._files_map.values()))
+            start = perf_counter()
+            while count[0] < lines:
+                watcher._read_lines(file)
+            seconds = perf_counter() - start
+        finally:
+            watcher.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return _throughput('read_lines', count[0], seconds, binary=binary)
+
+
+def run_benchmarks(lines: int = 100000,
+                   rate: float = 0.0,
+                   transports: Sequence[str] = TRANSPORTS,
+                   suite: str = 'all',
+                   batch_size: int = 1,
+                   progress: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Runs a suite of benchmarks.
+
+    :param lines:
+        The number of lines per benchmark.
+    :type lines: int
+
+    :param rate:
+        The number of lines per second to write for the pipeline benchmarks,
+        or ``0`` for writing as fast as possible.
+    :type rate: float
+
+    :param transports:
+        The transports for the pipeline benchmarks.
+    :type transports: Sequence[str]
+
+    :param suite:
+        ``pipeline``, ``micro``, or ``all``.
+    :type suite: str
+
+    :param batch_size:
+        The maximum number of lines per message
+        for the pipeline benchmarks.
+    :type batch_size: int
+
+    :param progress:
+        An optional text stream for printing the name of each benchmark.
+    :type progress: Optional[TextIO]
+
+    :return:
+        A dict with information about the environment
+        and a list with the results.
+    """
+    if suite not in SUITES:
+        raise ValueError("Unsupported benchmark suite: " + str(suite))
+    results = []
+
+    def run(name, f, *args, **kwargs):
+        if progress:
+            print(name, file=progress)
+        results.append(f(*args, **kwargs))
+
+    if suite in ('all', 'micro'):
+        run('config_process', bench_config, lines)
+        run('tail', bench_tail, lines)
+        run('read_lines', bench_read_lines, lines)
+        run('read_lines binary', bench_read_lines, lines, binary=True)
+    if suite in ('all', 'pipeline'):
+        for transport in transports:
+            for socket_type in SOCKETS:
+                for proxy in (False, True):
+                    run('pipeline {} {}{}'.format(
+                        transport, socket_type, ' proxy' if proxy else ''),
+                        bench_pipeline, lines, rate=rate,
+                        transport=transport, socket_type=socket_type,
+                        proxy=proxy, batch_size=batch_size)
+    return {
+        'logsweet': __version__,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results,
+    }
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains the functionality to persist the read offsets
+of watched files, so a restarted watcher resumes where it stopped.
+"""
+
+from typing import Optional
+import os
+import json
+import errno
+import hashlib
+from threading import Thread, Event, Lock
+
+FINGERPRINT_SIZE = 1024
+_FORMAT_VERSION = 1
+
+
+def _fingerprint(file_name: str, size: int) -> Optional[str]:
+    try:
+        with open(file_name, 'rb') as f:
+            head = f.read(size)
+    except EnvironmentError:
+        return None
+    if len(head) < size:
+        return None
+    return hashlib.sha1(head).hexdigest()
+
+
+class CheckpointStore(object):
+    """
+    Stores the byte offset up to which every watched file has been read.
+
+    Files are identified by the file id of the watcher,
+    which consists of the device and the inode on POSIX systems,
+    and by a fingerprint of the first bytes of the file.
+    So a file is recognized after it was renamed by a log rotation,
+    and a file which reuses the inode of a deleted file is not mistaken
+    for it.
+
+    The offsets are written to a JSON file by a background thread,
+    every `interval` seconds or after `max_lines` lines.
+    The file is written to a temporary file first,
+    which atomically replaces the previous one.
+
+    :param path:
+        The path of the checkpoint file.
+    :type path: str
+
+    :param interval:
+        The maximum time in seconds between two writes of the file.
+    :type interval: float
+
+    :param max_lines:
+        The number of read lines which triggers a write of the file
+        before the interval has passed.
+    :type max_lines: int
+    """
+
+    def __init__(self, path: str, interval: float = 1.0,
+                 max_lines: int = 10000):
+        self._path = path
+        self._interval = interval
+        self._max_lines = max_lines
+        self._files = {}
+        self._lock = Lock()
+        self._dirty = False
+        self._lines = 0
+        self._wakeup = Event()
+        self._closed = False
+        self.existed = self._load()
+        self._thread = Thread(target=self._run, name='logsweet-checkpoint',
+                              daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _load(self):
+        try:
+            with open(self._path, 'r', encoding='UTF-8') as f:
+                data = json.load(f)
+        except EnvironmentError as err:
+            if err.errno == errno.ENOENT:
+                return False
+            raise
+        if data.get('version') != _FORMAT_VERSION:
+            raise ValueError('Unsupported checkpoint file format.')
+        self._files = data.get('files', {})
+        return True
+
+    def resume_offset(self, fid: str, file_name: str) -> Optional[int]:
+        """
+        Determines the offset to resume reading a file at.
+
+        :param fid:
+            The file id.
+        :type fid: str
+
+        :param file_name:
+            The current name of the file.
+        :type file_name: str
+
+        :return:
+            The offset, if the file is known and unchanged;
+            ``0`` if the file id is known, but the file was truncated
+            or replaced; or `None` if the file is unknown.
+        """
+        with self._lock:
+            entry = self._files.get(fid)
+        if entry is None:
+            return None
+        offset = entry['offset']
+        head = entry['head']
+        try:
+            size = os.path.getsize(file_name)
+        except EnvironmentError:
+            return None
+        if size < offset:
+            return 0
+        if head and _fingerprint(file_name, head) != entry['fingerprint']:
+            return 0
+        return offset
+
+    def update(self, fid: str, file_name: str, offset: int, lines: int = 0):
+        """
+        Records the offset up to which a file has been read.
+
+        :param fid:
+            The file id.
+        :type fid: str
+
+        :param file_name:
+            The current name of the file.
+        :type file_name: str
+
+        :param offset:
+            The number of bytes which have been read.
+        :type offset: int
+
+        :param lines:
+            The number of lines read since the last update.
+        :type lines: int
+        """
+        with self._lock:
+            entry = self._files.get(fid)
+            if entry is None:
+                entry = {'head': 0, 'fingerprint': None}
+                self._files[fid] = entry
+            entry['name'] = file_name
+            entry['offset'] = offset
+            if offset < entry['head']:
+                # the file was truncated, the fingerprint is outdated
+                entry['head'] = 0
+                entry['fingerprint'] = None
+            head = min(offset, FINGERPRINT_SIZE)
+            if head > entry['head']:
+                fingerprint = _fingerprint(file_name, head)
+                if fingerprint:
+                    entry['head'] = head
+                    entry['fingerprint'] = fingerprint
+            self._dirty = True
+            self._lines += lines
+            if self._lines >= self._max_lines:
+                self._wakeup.set()
+
+    def remove(self, fid: str):
+        """
+        Forgets a file, e.g. when it left the set of watched files.
+        """
+        with self._lock:
+            if self._files.pop(fid, None) is not None:
+                self._dirty = True
+
+    def flush(self):
+        """
+        Writes the offsets to the checkpoint file, if they changed.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'version': _FORMAT_VERSION,
+                    'files': {fid: dict(entry)
+                              for fid, entry in self._files.items()}}
+            self._dirty = False
+            self._lines = 0
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w', encoding='UTF-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except EnvironmentError as e:
+                print('Error writing checkpoint file: ', str(e))
+
+    def close(self):
+        """
+        Stops the background thread and writes the offsets.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
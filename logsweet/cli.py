@@ -3,10 +3,14 @@
 This module provides the CLI for the tool.
 """
 
+import sys
+import json
 import click
 import socket
 from .core import write_logfiles, watch_and_send, listen_and_print, \
     proxy as proxy_messages
+from .bench import run_benchmarks, TRANSPORTS, SUITES
+from .watch import GlobSpec
 
 
 @click.group(help='A suite with a variety of tools for handling log messages.')
@@ -25,7 +29,14 @@ def mock(logfiles, interval, max_lines):
 
 
 @main.command(help='Follow logfiles '
-                   'and send new lines via ZeroMQ PUB and/or PUSH socket.')
+                   'and send new lines via ZeroMQ PUB and/or PUSH socket. '
+                   'Every FILE_GLOB can be followed by settings '
+                   'for the matching files, separated by semicolons, '
+                   'e.g. "/var/log/nginx/*.log;encoding=latin-1;tail=10;'
+                   'tag=nginx"; the settings are encoding, tail, all, '
+                   'and tag, which is sent as source name. '
+                   'More files can be configured with the key "watch" '
+                   'in the configuration file.')
 @click.option('-b', '--bind-address', type=str, default=None,
               help='IP and port to bind the ZeroMQ PUB socket.')
 @click.option('-c', '--connect-address', type=str, multiple=True,
@@ -49,14 +60,42 @@ def mock(logfiles, interval, max_lines):
               help='The source name for the watched logs.')
 @click.option('--echo', is_flag=True,
               help='Print events to the console.')
-@click.argument('file-glob')
+@click.option('--backend', type=click.Choice(['auto', 'inotify', 'poll']),
+              default='auto',
+              help='The mechanism to detect file changes.')
+@click.option('--binary', is_flag=True,
+              help='Forward lines as raw bytes without decoding them. '
+                   'Requires UTF-8 encoded files: fails if the encoding, '
+                   'or without --encoding the locale encoding, '
+                   'is not UTF-8.')
+@click.option('--batch-size', type=int, default=1,
+              help='The maximum number of lines to send in one message.')
+@click.option('--batch-linger', type=float, default=0.0,
+              help='The maximum time in seconds to hold back '
+                   'an incomplete batch of lines.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              default=None,
+              help='A file for persisting the read offsets, '
+                   'to resume where the previous run stopped.')
+@click.option('--shards', type=int, default=1,
+              help='The number of threads reading the files. '
+                   'Distributes the files over multiple threads, '
+                   'so a slow or busy file does not delay the others.')
+@click.argument('file-glob', nargs=-1)
 def watch(file_glob, bind_address, connect_address,
           config_file, exec_actions,
           all_lines, tail_lines, encoding,
-          name, echo):
+          name, echo, backend, binary,
+          batch_size, batch_linger, checkpoint, shards):
     if bind_address is None and not connect_address:
         bind_address = '127.0.0.1:9000'
-    watch_and_send(file_glob,
+    try:
+        specs = [GlobSpec.parse(g) for g in file_glob]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='FILE_GLOB')
+    if not specs and not config_file:
+        raise click.UsageError('Missing argument "FILE_GLOB".')
+    watch_and_send(specs,
                    bind_address=bind_address,
                    connect_addresses=connect_address,
                    config_file=config_file,
@@ -65,7 +104,13 @@ def watch(file_glob, bind_address, connect_address,
                    tail_lines=tail_lines,
                    encoding=encoding,
                    name=name or socket.gethostname(),
-                   echo=echo)
+                   echo=echo,
+                   backend=backend,
+                   binary=binary,
+                   batch_size=batch_size,
+                   batch_linger=batch_linger,
+                   checkpoint_file=checkpoint,
+                   shards=shards)
 
 
 @main.command(help='Listen to text lines with ZeroMQ SUB and/or PULL socket.')
@@ -82,11 +127,21 @@ def watch(file_glob, bind_address, connect_address,
 @click.option('-x', '--exec-actions', is_flag=True,
               help='Activates the execution of action rules '
                    'from the configuration.')
-def listen(bind_address, connect_address, config_file, exec_actions):
+@click.option('-w', '--workers', type=int, default=0,
+              help='The number of worker processes for processing lines '
+                   'according to the configuration. '
+                   '0 processes them in the listener process.')
+@click.option('--max-batch', type=int, default=1000,
+              help='The maximum number of messages to receive '
+                   'from one socket at once.')
+def listen(bind_address, connect_address, config_file, exec_actions,
+           workers, max_batch):
     listen_and_print(bind_address=bind_address,
                      connect_addresses=connect_address,
                      config_file=config_file,
-                     exec_actions=exec_actions)
+                     exec_actions=exec_actions,
+                     workers=workers,
+                     max_batch=max_batch)
 
 
 @main.command(help='Run a log proxy between watchers and listeners. '
@@ -109,10 +164,20 @@ def listen(bind_address, connect_address, config_file, exec_actions):
                    'ZeroMQ PUSH socket '
                    'for transmitting log messages to a listener '
                    'or other proxies.')
+@click.option('--native', is_flag=True,
+              help='Forward messages inside of ZeroMQ '
+                   'without passing them through Python. '
+                   'Requires exactly one backend and one frontend socket.')
+@click.option('--stats', is_flag=True,
+              help='Print the number of forwarded messages and bytes '
+                   'when stopping the native proxy. '
+                   'Counting limits the throughput of the native proxy, '
+                   'because forwarding blocks when the counting lags behind.')
 def proxy(backend_bind_address,
           backend_connect_address,
           frontend_bind_address,
-          frontend_connect_address):
+          frontend_connect_address,
+          native, stats):
 
     if backend_bind_address is None and not backend_connect_address:
         backend_bind_address = '127.0.0.1:9001'
@@ -122,7 +187,35 @@ def proxy(backend_bind_address,
     proxy_messages(backend_bind_address=backend_bind_address,
                    backend_connect_addresses=backend_connect_address,
                    frontend_bind_address=frontend_bind_address,
-                   frontend_connect_addresses=frontend_connect_address)
+                   frontend_connect_addresses=frontend_connect_address,
+                   native=native,
+                   stats=stats)
+
+
+@main.command(help='Measure the throughput and latency of logsweet '
+                   'and print the results as JSON.')
+@click.option('-n', '--lines', type=int, default=100000,
+              help='The number of lines per benchmark.')
+@click.option('-r', '--rate', type=float, default=0.0,
+              help='The number of lines per second to write '
+                   'in the pipeline benchmarks. 0 writes as fast as possible.')
+@click.option('-t', '--transport', type=click.Choice(TRANSPORTS),
+              multiple=True,
+              help='The transport(s) for the pipeline benchmarks. '
+                   'Defaults to all.')
+@click.option('-s', '--suite', type=click.Choice(SUITES), default='all',
+              help='The benchmarks to run.')
+@click.option('--batch-size', type=int, default=1,
+              help='The maximum number of lines to send in one message.')
+@click.option('-o', '--output', type=click.File('w'), default='-',
+              help='The file to write the JSON results to.')
+def bench(lines, rate, transport, suite, batch_size, output):
+    results = run_benchmarks(lines=lines, rate=rate,
+                             transports=transport or TRANSPORTS,
+                             suite=suite, batch_size=batch_size,
+                             progress=sys.stderr)
+    json.dump(results, output, indent=2)
+    output.write('\n')
 
 
 if __name__ == '__main__':
@@ -8,6 +8,7 @@ according to the match of regular expression.
 from typing import Optional, Mapping, Tuple
 import re
 import os
+from .patterns import required_literal
 
 # check if os is windows
 if os.name == 'nt':
@@ -82,6 +83,9 @@ class ColorRule(object):
         `match` with a color for the matched string,
         and more entries with colors for every named group in the regex.
     :type config: Mapping[str, str]
+
+    The attribute `literal` holds a string, which is contained in every
+    matching line, or `None`; see :py:class:`logsweet.patterns.RuleSet`.
     """
 
     def __init__(self, config: Mapping[str, str]):
@@ -92,6 +96,7 @@ class ColorRule(object):
             self._pattern = None
         else:
             self._format = _build_format_handler(config, self._pattern)
+        self.literal = required_literal(self._pattern)
 
     def process(self, line: str) -> Tuple[bool, str]:
         """
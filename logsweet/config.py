@@ -6,14 +6,14 @@ a `logsweet` configuration from a YAML file.
 """
 
 from typing import Optional, Mapping, Union, Sequence
-import re
 import yaml
 try:
     from yaml import CLoader as Loader
 except ImportError:
     from yaml import Loader
+from .patterns import combine_patterns, RuleSet
 from .colors import ColorRule
-from .actions import HttpActionRule
+from .actions import HttpActionRule, ActionDispatcher
 
 
 def _read_config(file):
@@ -38,6 +38,11 @@ class Filter(object):
         each with either a string or a sequence of strings.
         Each string represents a regular expression.
     :type config: Mapping[str, Union[str, Sequence[str]]]
+
+    The include and the exclude expressions are merged into
+    one alternation each, so a line is scanned once per list.
+    Expressions, which can not be merged safely,
+    e.g. because of backreferences, are evaluated one by one.
     """
 
     def __init__(self, config: Mapping[str, Union[str, Sequence[str]]]):
@@ -45,12 +50,12 @@ class Filter(object):
         include = config['include'] if 'include' in config else []
         if type(include) is str:
             include = [include]
-        self._include_patterns = [re.compile(p) for p in include]
+        self._include_patterns = combine_patterns(include)
 
         exclude = config['exclude'] if 'exclude' in config else []
         if type(exclude) is str:
             exclude = [exclude]
-        self._exclude_patterns = [re.compile(p) for p in exclude]
+        self._exclude_patterns = combine_patterns(exclude)
 
     def is_match(self, line: str) -> bool:
         """
@@ -62,9 +67,16 @@ class Filter(object):
 
         :returns: `True` if the line passes; otherwise `False`
         """
-        return (len(self._include_patterns) == 0 or
-                any(map(lambda p: p.search(line), self._include_patterns))) \
-            and not any(map(lambda p: p.search(line), self._exclude_patterns))
+        if self._include_patterns:
+            for p in self._include_patterns:
+                if p.search(line):
+                    break
+            else:
+                return False
+        for p in self._exclude_patterns:
+            if p.search(line):
+                return False
+        return True
 
     def __call__(self, line: str) -> bool:
         return self.is_match(line)
@@ -81,6 +93,15 @@ class Configuration(object):
     :param exec_actions:
         A switch activate the execution of actions.
     :type exec_actions: bool
+
+    The HTTP requests of the actions are sent by the
+    :py:class:`logsweet.actions.ActionDispatcher` in the attribute
+    `dispatcher`, which is configured by the optional key `dispatcher`.
+
+    The optional key `watch` contains a list of files to watch,
+    each a glob pattern, or a map with the keys `glob`, and optionally
+    `encoding`, `tail`, `all`, and `tag`; available in the attribute
+    `watch`. See :py:meth:`logsweet.watch.GlobSpec.from_config`.
     """
 
     def __init__(self, file: str, exec_actions: bool = False):
@@ -94,11 +115,13 @@ class Configuration(object):
         self._exec_actions = exec_actions
         self._filter = Filter(data)
 
-        self._colors = [ColorRule(r) for r in data['colors']] \
-            if 'colors' in data else []
+        self.watch = list(data.get('watch', []))
+
+        self._colors = RuleSet(ColorRule(r) for r in data.get('colors', []))
 
-        self._actions = [HttpActionRule(r) for r in data['actions']] \
-            if 'actions' in data else []
+        self.dispatcher = ActionDispatcher.from_config(data.get('dispatcher'))
+        self._actions = RuleSet(HttpActionRule(r, self.dispatcher)
+                                for r in data.get('actions', []))
 
     def process(self, line: str) -> Optional[str]:
         """
@@ -115,10 +138,16 @@ class Configuration(object):
         if not self._filter(line):
             return None
         if self._exec_actions:
-            for r in self._actions:
+            for r in self._actions.candidates(line):
                 match, line = r.process(line)
-        for r in self._colors:
+        for r in self._colors.candidates(line):
             match, line = r.process(line)
             if match:
                 break
         return line
+
+    def close(self):
+        """
+        Waits for pending actions and releases their resources.
+        """
+        self.dispatcher.close()
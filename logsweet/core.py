@@ -4,32 +4,102 @@
 This module contains the core functionality.
 """
 
-from typing import Optional, Sequence, TextIO
-from time import sleep
+from typing import Optional, Sequence, TextIO, Union
+import sys
+import codecs
+import locale
+from time import sleep, time
 from random import choice
+from zmq import ZMQError
 
 from logsweet.config import Configuration
 from .signals import is_stopped
 from .mock import random_log_message
-from .watch import LogWatcher
-from .net import Broadcaster, Transmitter, Listener
+from .watch import LogWatcher, ShardedLogWatcher, GlobSpec, glob_specs
+from .checkpoint import CheckpointStore
+from .net import Broadcaster, Transmitter, Listener, ProxyDevice
+from .parallel import ProcessingPool
+
+_LINE_ENCODING = 'UTF-8'
 
 
 class LogWatcherHandler(object):
+    """
+    A handler for :py:class:`logsweet.watch.LogWatcher`,
+    which processes new lines according to an optional configuration,
+    and sends them via a broadcaster and/or a transmitter.
+
+    Lines can be given as `str` or as UTF-8 encoded `bytes`.
+    Bytes are only decoded if the configuration or the echo
+    actually require the text, and are sent without transcoding.
+
+    If `batch_size` is greater than 1, the lines of a file are sent
+    in batches with the message type ``lines``;
+    otherwise every line is sent in its own ``line`` message.
+    A batch is sent as soon as it is full,
+    or when it is older than `batch_linger` seconds
+    at the next call to :py:meth:`notify_flush`.
+
+    The lines of a file with a tag, see :py:meth:`notify_tag`,
+    are sent with the tag as source name instead of `name`.
+    """
 
     def __init__(self, name: str,
                  config: Optional[Configuration],
                  echo: bool,
                  bc: Optional[Broadcaster] = None,
-                 tm: Optional[Transmitter] = None):
+                 tm: Optional[Transmitter] = None,
+                 batch_size: int = 1,
+                 batch_linger: float = 0.0):
         self._name = name
         self._cfg = config
         self._echo = echo
         self._bc = bc
         self._tm = tm
+        self._batch_size = max(1, batch_size)
+        self._batch_linger = batch_linger
+        self._batches = {}
+        self._tags = {}
+
+    def _source(self, file_name):
+        return self._tags.get(file_name, self._name)
+
+    def _send_batch(self, file_name, full_only=False):
+        since, lines = self._batches.pop(file_name)
+        size = self._batch_size
+        end = len(lines)
+        if full_only:
+            end -= end % size
+            if end < len(lines):
+                self._batches[file_name] = (since, lines[end:])
+        topic = 'log|lines|{}|{}'.format(self._source(file_name), file_name)
+        for i in range(0, end, size):
+            chunk = lines[i:i + size]
+            if self._bc:
+                self._bc.send_lines(topic, chunk)
+            if self._tm:
+                self._tm.send_lines(topic, chunk)
+
+    def notify_flush(self):
+        """
+        Sends all pending batches, which are older than `batch_linger`.
+        """
+        if not self._batches:
+            return
+        deadline = time() - self._batch_linger
+        for file_name, (since, _) in list(self._batches.items()):
+            if since <= deadline:
+                self._send_batch(file_name)
+
+    def flush(self):
+        """
+        Sends all pending batches.
+        """
+        for file_name in list(self._batches.keys()):
+            self._send_batch(file_name)
 
     def notify_watch(self, file_name):
-        topic = 'log|watch|{}|{}'.format(self._name, file_name)
+        topic = 'log|watch|{}|{}'.format(self._source(file_name), file_name)
         if self._bc:
             self._bc.send(topic, '')
         if self._tm:
@@ -38,7 +108,10 @@ class LogWatcherHandler(object):
             print('START WATCHING: ' + file_name)
 
     def notify_unwatch(self, file_name):
-        topic = 'log|unwatch|{}|{}'.format(self._name, file_name)
+        if file_name in self._batches:
+            self._send_batch(file_name)
+        topic = 'log|unwatch|{}|{}'.format(self._source(file_name), file_name)
+        self._tags.pop(file_name, None)
         if self._bc:
             self._bc.send(topic, '')
         if self._tm:
@@ -46,18 +119,64 @@ class LogWatcherHandler(object):
         if self._echo:
             print('STOP WATCHING: ' + file_name)
 
+    def notify_tag(self, file_name, tag):
+        """
+        Sends the lines of a file with the given tag as source name.
+        """
+        self._tags[file_name] = tag
+
+    def notify_truncate(self, file_name):
+        if file_name in self._batches:
+            self._send_batch(file_name)
+        topic = 'log|truncate|{}|{}'.format(self._source(file_name), file_name)
+        if self._bc:
+            self._bc.send(topic, '')
+        if self._tm:
+            self._tm.send(topic, '')
+        if self._echo:
+            print('TRUNCATED: ' + file_name)
+
     def notify_lines(self, file_name, lines):
-        topic = 'log|line|{}|{}'.format(self._name, file_name)
-        for line in lines:
-            line2 = self._cfg.process(line) if self._cfg else line
-            if line2 is None:
-                continue
+        if self._batch_size > 1:
+            self._queue_lines(file_name, lines)
+            return
+        topic = 'log|line|{}|{}'.format(self._source(file_name), file_name)
+        for line in self._process_lines(file_name, lines):
             if self._bc:
                 self._bc.send(topic, line)
             if self._tm:
                 self._tm.send(topic, line)
-            if self._echo:
-                print('LINE: {} | {}'.format(file_name, line2))
+
+    def _queue_lines(self, file_name, lines):
+        lines = list(self._process_lines(file_name, lines))
+        if not lines:
+            return
+        if file_name in self._batches:
+            self._batches[file_name][1].extend(lines)
+        else:
+            self._batches[file_name] = (time(), lines)
+        if self._batch_linger <= 0:
+            self._send_batch(file_name)
+        elif len(self._batches[file_name][1]) >= self._batch_size:
+            self._send_batch(file_name, full_only=True)
+
+    def _process_lines(self, file_name, lines):
+        if not self._cfg and not self._echo:
+            return lines
+        return filter(lambda line: line is not None,
+                      (self._process_line(file_name, line) for line in lines))
+
+    def _process_line(self, file_name, line):
+        if isinstance(line, bytes):
+            text = line.decode(encoding=_LINE_ENCODING, errors='ignore')
+        else:
+            text = line
+        line2 = self._cfg.process(text) if self._cfg else text
+        if line2 is None:
+            return None
+        if self._echo:
+            print('LINE: {} | {}'.format(file_name, line2))
+        return line
 
 
 def write_logfiles(logfiles: Sequence[str],
@@ -101,7 +220,10 @@ def write_logfiles(logfiles: Sequence[str],
 
 
 def _watch_and_send_greeting(**kwargs):
-    print("Listening to file(s): " + kwargs.get('file_glob'))
+    print("Listening to file(s):")
+    for spec in kwargs.get('specs'):
+        print("  - " + spec.pattern +
+              (" [{}]".format(spec.tag) if spec.tag is not None else ''))
     if kwargs.get('bind_address'):
         print("Broadcasting with ZeroMQ PUB at: " + kwargs.get('bind_address'))
     if kwargs.get('connect_addresses'):
@@ -118,7 +240,25 @@ def _watch_and_send_greeting(**kwargs):
             print("Executing actions from configuration.")
 
 
-def watch_and_send(file_glob: str,
+def _close_config(config, exec_actions):
+    config.close()
+    if exec_actions:
+        print("Actions: {sent} sent, {failed} failed, {dropped} dropped, "
+              "{coalesced} coalesced".format(**config.dispatcher.stats()))
+
+
+def _check_binary_encoding(encoding: Optional[str]):
+    # lines are forwarded undecoded and listeners decode them as UTF-8
+    encoding = encoding or locale.getpreferredencoding(False)
+    if codecs.lookup(encoding).name not in ('utf-8', 'ascii'):
+        raise ValueError(
+            'Binary mode requires UTF-8 encoded files, '
+            'but the encoding is {}. '
+            'Specify the encoding UTF-8 explicitly, '
+            'if the files are UTF-8 encoded.'.format(encoding))
+
+
+def watch_and_send(file_glob: Union[str, GlobSpec, Sequence[Union[str, GlobSpec]]],
                    bind_address: Optional[str] = None,
                    connect_addresses: Optional[Sequence[str]] = None,
                    config_file: Optional[TextIO] = None,
@@ -127,14 +267,25 @@ def watch_and_send(file_glob: str,
                    tail_lines: int = 0,
                    encoding: Optional[str] = None,
                    name: str = 'unknown',
-                   echo: bool = False):
+                   echo: bool = False,
+                   backend: str = 'auto',
+                   binary: bool = False,
+                   batch_size: int = 1,
+                   batch_linger: float = 0.0,
+                   checkpoint_file: Optional[str] = None,
+                   shards: int = 1):
     """
     Start following text files, sending new lines
     via a ZeroMQ PUB and/or PUSH socket.
 
     :param file_glob:
-        A path to the text file to tail.
-    :type file_glob: str
+        A glob pattern for the text files to tail,
+        or a :py:class:`logsweet.watch.GlobSpec` with its own encoding,
+        tail or all lines setting, and tag; or a sequence of them.
+        The glob specs from the key `watch` of the configuration
+        are added. All files are watched in one loop,
+        and sent through the same sockets.
+    :type file_glob: Union[str, GlobSpec, Sequence[Union[str, GlobSpec]]]
 
     :param bind_address:
         The address to bind the PUB socket to;
@@ -176,10 +327,55 @@ def watch_and_send(file_glob: str,
         Specifies the encoding for reading the text files.
         If `None` defaults to preferred encoding of current user.
     :type encoding: Optional[str]
-    """
-    _watch_and_send_greeting(**locals())
 
+    :param backend:
+        The mechanism to detect file changes:
+        ``auto``, ``inotify``, or ``poll``.
+        See :py:class:`logsweet.watch.LogWatcher`.
+    :type backend: str
+
+    :param binary:
+        If `True`, the files are read as raw bytes and the lines are
+        forwarded without decoding them; only supported for UTF-8
+        encoded files.
+        Raises a `ValueError` if `encoding`, or the preferred encoding
+        of the locale if `encoding` is `None`, is not compatible to UTF-8.
+    :type binary: bool
+
+    :param batch_size:
+        The maximum number of lines to send in one message.
+        If greater than 1, lines are sent with the message type ``lines``,
+        which requires listeners and proxies of the same version.
+    :type batch_size: int
+
+    :param batch_linger:
+        The maximum time in seconds to hold back an incomplete batch,
+        waiting for more lines.
+    :type batch_linger: float
+
+    :param checkpoint_file:
+        The path of a file for persisting the read offsets of the files.
+        If the file exists, the watcher resumes reading where the previous
+        run stopped. See :py:class:`logsweet.checkpoint.CheckpointStore`.
+    :type checkpoint_file: Optional[str]
+
+    :param shards:
+        The number of threads reading the files.
+        If greater than 1, the files are distributed over multiple
+        reader threads, and the statistics of the threads are printed
+        at the end. See :py:class:`logsweet.watch.ShardedLogWatcher`.
+    :type shards: int
+    """
     config = Configuration(config_file, exec_actions) if config_file else None
+    specs = glob_specs(file_glob) + \
+        [GlobSpec.from_config(g) for g in (config.watch if config else [])]
+    if not specs:
+        raise ValueError("No files to watch: give a glob pattern, "
+                         "or configure them with the key 'watch'.")
+    if binary:
+        for spec in specs:
+            _check_binary_encoding(spec.encoding or encoding)
+    _watch_and_send_greeting(**locals())
 
     broadcaster = Broadcaster(bind_address) \
         if bind_address else None
@@ -187,24 +383,51 @@ def watch_and_send(file_glob: str,
         if connect_addresses else None
 
     handler = LogWatcherHandler(name, config, echo,
-                                bc=broadcaster, tm=transmitter)
-    watcher = LogWatcher(file_glob, handler,
-                         all_lines=all_lines, tail_lines=tail_lines,
-                         encoding=encoding)
+                                bc=broadcaster, tm=transmitter,
+                                batch_size=batch_size,
+                                batch_linger=batch_linger)
+    checkpoint = CheckpointStore(checkpoint_file) \
+        if checkpoint_file else None
+    watcher_args = dict(all_lines=all_lines, tail_lines=tail_lines,
+                        encoding=encoding, backend=backend,
+                        binary=binary, checkpoint=checkpoint)
+    if shards > 1:
+        watcher = ShardedLogWatcher(specs, handler, shards=shards,
+                                    **watcher_args)
+    else:
+        watcher = LogWatcher(specs, handler, **watcher_args)
     try:
         watcher.watch()
     finally:
+        handler.flush()
+        if checkpoint:
+            checkpoint.close()
         if broadcaster:
             broadcaster.close()
         if transmitter:
             transmitter.close()
+        if config:
+            _close_config(config, exec_actions)
+        if shards > 1:
+            _print_shard_stats(watcher)
+        watcher.close()
+
+
+def _print_shard_stats(watcher):
+    for i, stats in enumerate(watcher.shard_stats()):
+        print("Shard {}: {files} files, {lines} lines, latency "
+              "{avg:.1f} ms average, {max:.1f} ms maximum".format(
+                  i, avg=stats['latency_avg'] * 1000.0,
+                  max=stats['latency_max'] * 1000.0, **stats))
 
 
 def listen_and_print(bind_address: Optional[str] = None,
                      connect_addresses: Optional[Sequence[str]] = None,
                      config_file: Optional[TextIO] = None,
                      interval: float = 0.1,
-                     exec_actions: bool = False):
+                     exec_actions: bool = False,
+                     workers: int = 0,
+                     max_batch: int = 1000):
     """
     Connects to watchers and proxies with a ZeroMQ SUB socket
     and/or binds a ZeroMQ PULL socket for watchers and proxies
@@ -233,28 +456,121 @@ def listen_and_print(bind_address: Optional[str] = None,
     :param exec_actions:
         A switch to activate the execution of actions.
     :type exec_actions: bool
+
+    :param workers:
+        The number of worker processes for processing the lines
+        according to the configuration.
+        If 0, the lines are processed in the receiving process.
+        Has no effect without a configuration file.
+    :type workers: int
+
+    :param max_batch:
+        The maximum number of messages to receive from one socket
+        in one iteration.
+        The output for all messages of an iteration is written at once.
+    :type max_batch: int
     """
+    if config_file and workers > 0:
+        _listen_and_print_parallel(bind_address, connect_addresses,
+                                   config_file, interval, exec_actions,
+                                   workers, max_batch)
+        return
 
     config = Configuration(config_file, exec_actions) if config_file else None
+    output = []
 
     def handle_line(source, file_name, line):
         if config:
             line = config.process(line)
         if line is not None:
-            print("LINE {}: {} | {}".format(source, file_name, line))
+            output.append(_format_event(('line', source, file_name, line)))
 
     def handle_watch(source, file_name):
-        print("BEGIN {}: {}".format(source, file_name))
+        output.append(_format_event(('watch', source, file_name)))
 
     def handle_unwatch(source, file_name):
-        print("END {}: {}".format(source, file_name))
+        output.append(_format_event(('unwatch', source, file_name)))
+
+    def handle_truncate(source, file_name):
+        output.append(_format_event(('truncate', source, file_name)))
+
+    def handle_flush():
+        if output:
+            _print_output(output)
+            output.clear()
 
     listener = Listener(handler=handle_line,
                         watch_cb=handle_watch, unwatch_cb=handle_unwatch,
+                        truncate_cb=handle_truncate,
+                        flush_cb=handle_flush,
                         bind_address=bind_address,
                         connect_addresses=connect_addresses,
-                        interval=interval)
-    listener.listen()
+                        interval=interval,
+                        max_batch=max_batch)
+    try:
+        listener.listen()
+    finally:
+        handle_flush()
+        if config:
+            _close_config(config, exec_actions)
+
+
+_EVENT_FORMATS = {
+    'line': "LINE {}: {} | {}",
+    'watch': "BEGIN {}: {}",
+    'unwatch': "END {}: {}",
+    'truncate': "TRUNCATE {}: {}",
+}
+
+
+def _format_event(event):
+    return _EVENT_FORMATS[event[0]].format(*event[1:])
+
+
+def _print_event(event):
+    print(_format_event(event))
+
+
+def _print_output(output):
+    # one write per received batch instead of one per line
+    sys.stdout.write('\n'.join(output) + '\n')
+    sys.stdout.flush()
+
+
+def _listen_and_print_parallel(bind_address, connect_addresses,
+                               config_file, interval, exec_actions,
+                               workers, max_batch):
+    events = []
+
+    def handle_line(source, file_name, line):
+        events.append(('line', source, file_name, line))
+
+    def handle_watch(source, file_name):
+        events.append(('watch', source, file_name))
+
+    def handle_unwatch(source, file_name):
+        events.append(('unwatch', source, file_name))
+
+    def handle_truncate(source, file_name):
+        events.append(('truncate', source, file_name))
+
+    with ProcessingPool(config_file, exec_actions, _print_event,
+                        workers=workers) as pool:
+
+        def handle_flush():
+            pool.submit(events)
+            events.clear()
+
+        listener = Listener(handler=handle_line,
+                            watch_cb=handle_watch, unwatch_cb=handle_unwatch,
+                            truncate_cb=handle_truncate,
+                            flush_cb=handle_flush,
+                            bind_address=bind_address,
+                            connect_addresses=connect_addresses,
+                            interval=interval,
+                            max_batch=max_batch)
+        listener.listen()
+        handle_flush()
 
 
 def _proxy_greeting(**kwargs):
@@ -279,7 +595,9 @@ def proxy(backend_bind_address: Optional[str] = None,
           backend_connect_addresses: Optional[Sequence[str]] = None,
           frontend_bind_address: Optional[str] = None,
           frontend_connect_addresses: Optional[Sequence[str]] = None,
-          interval: float = 0.1):
+          interval: float = 0.1,
+          native: bool = False,
+          stats: bool = False):
     """
     :param backend_bind_address:
         The address to bind the PULL socket to.
@@ -305,24 +623,62 @@ def proxy(backend_bind_address: Optional[str] = None,
         The timeout in seconds when waiting for new messages
         before handling possible interruption.
     :type interval: float
+
+    :param native:
+        If `True`, the messages are forwarded inside of libzmq
+        without passing them through Python.
+        Requires exactly one backend and one frontend socket,
+        falls back to forwarding in Python otherwise.
+        See :py:class:`logsweet.net.ProxyDevice`.
+    :type native: bool
+
+    :param stats:
+        If `True`, the number of forwarded messages and bytes
+        is printed when the proxy stops.
+        Only supported in native mode.
+        Counting passes a copy of every message through Python,
+        and the native forwarding blocks when the counting lags behind,
+        so this limits the throughput of the native mode.
+    :type stats: bool
     """
     _proxy_greeting(**locals())
 
+    if native:
+        try:
+            device = ProxyDevice(
+                bind_address=backend_bind_address,
+                connect_addresses=backend_connect_addresses,
+                frontend_bind_address=frontend_bind_address,
+                frontend_connect_addresses=frontend_connect_addresses,
+                capture=stats)
+            device.start()
+        except (ValueError, ZMQError) as e:
+            print("Falling back to forwarding in Python: " + str(e))
+        else:
+            print("Forwarding natively in ZeroMQ.")
+            device.run(interval=interval)
+            if stats:
+                print("Forwarded {} messages with {} bytes.".format(
+                    device.messages, device.bytes))
+            return
+
     broadcaster = Broadcaster(frontend_bind_address) \
         if frontend_bind_address else None
     transmitter = Transmitter(frontend_connect_addresses) \
         if frontend_connect_addresses else None
 
-    def handle_message(data: Sequence[bytes]):
-        if broadcaster:
-            broadcaster.send_raw(data)
-        if transmitter:
-            transmitter.send_raw(data)
+    def handle_messages(batch: Sequence[Sequence[bytes]]):
+        for data in batch:
+            if broadcaster:
+                broadcaster.send_raw(data)
+            if transmitter:
+                transmitter.send_raw(data)
 
-    listener = Listener(raw_cb=handle_message,
+    listener = Listener(raw_batch_cb=handle_messages,
                         bind_address=backend_bind_address,
                         connect_addresses=backend_connect_addresses,
-                        interval=interval)
+                        interval=interval,
+                        copy=False)
 
     try:
         listener.listen()
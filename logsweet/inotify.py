@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains a minimal binding to the Linux inotify API,
+allowing to block until watched directories report changes.
+
+It is used by :py:class:`logsweet.watch.LogWatcher`
+if available, and falls back to polling otherwise.
+"""
+
+from typing import Optional, List, Tuple
+import os
+import sys
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o0004000
+
+DIRECTORY_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct('iIII')
+_BUFFER_SIZE = 65536
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+_libc = _load_libc()
+
+
+def is_available() -> bool:
+    """
+    Checks whether the inotify API can be used on this platform.
+
+    :return: bool
+    """
+    return _libc is not None
+
+
+def _raise_errno():
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
+
+
+class Inotify(object):
+    """
+    An inotify instance watching a set of directories.
+
+    Raises an `OSError` if inotify is not available.
+    """
+
+    def __init__(self):
+        if _libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            _raise_errno()
+        self._fd = fd
+        self._paths = {}
+        self._wds = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def fileno(self) -> int:
+        """
+        Returns the file descriptor of the inotify instance,
+        which becomes readable when events are pending.
+        """
+        return self._fd
+
+    def is_watching(self, path: str) -> bool:
+        """
+        Checks whether the given directory is already watched.
+        """
+        return path in self._wds
+
+    def add_watch(self, path: str, mask: int = DIRECTORY_MASK) -> bool:
+        """
+        Starts watching a directory.
+
+        :param path:
+            The path of the directory.
+        :type path: str
+
+        :param mask:
+            The inotify event mask.
+        :type mask: int
+
+        :return:
+            `True` if the directory is watched;
+            `False` if it does not exist or can not be watched.
+        """
+        if path in self._wds:
+            return True
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR,
+                                      errno.EACCES):
+                return False
+            _raise_errno()
+        self._paths[wd] = path
+        self._wds[path] = wd
+        return True
+
+    def remove_watch(self, path: str):
+        """
+        Stops watching a directory.
+        """
+        wd = self._wds.pop(path, None)
+        if wd is None:
+            return
+        del self._paths[wd]
+        _libc.inotify_rm_watch(self._fd, wd)
+
+    def read_events(self, timeout: Optional[float] = None) \
+            -> List[Tuple[Optional[str], int]]:
+        """
+        Waits for pending events and reads them.
+
+        :param timeout:
+            The maximum time to wait in seconds.
+            If `None` blocks until an event occurs.
+        :type timeout: Optional[float]
+
+        :return:
+            A list of tuples with the path of the affected file or directory
+            and the event mask. On a queue overflow the path is `None`.
+        """
+        if self._fd < 0:
+            return []
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, _BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            self._parse_events(data, events)
+        return events
+
+    def _parse_events(self, data, events):
+        pos = 0
+        header_size = _EVENT_HEADER.size
+        while pos + header_size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, pos)
+            pos += header_size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+                continue
+            path = self._paths.get(wd)
+            if mask & IN_IGNORED:
+                if path is not None:
+                    del self._paths[wd]
+                    del self._wds[path]
+                continue
+            if path is None:
+                continue
+            if name:
+                path = os.path.join(path, os.fsdecode(name))
+            events.append((path, mask))
+
+    def close(self):
+        """
+        Closes the inotify instance and releases all watches.
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._paths.clear()
+        self._wds.clear()
@@ -3,21 +3,53 @@
 """
 This module contains functionality for transporting
 log messages over the network.
+
+Addresses are given as IP or hostname and port, e.g. ``127.0.0.1:9000``,
+for TCP; or as complete ZeroMQ endpoints, e.g. ``inproc://logs``.
 """
 
-from typing import Any, Union, Optional, Callable, Sequence, Iterable
-from zmq import Context, Poller, \
-    PUB, SUB, PUSH, PULL, SUBSCRIBE, NOBLOCK, POLLIN
+from typing import Any, Union, Optional, Callable, Sequence, Iterable, List
+from threading import Thread
+from time import sleep, time
+from zmq import Context, Poller, ZMQError, Again, proxy_steerable, \
+    PUB, SUB, PUSH, PULL, PAIR, SUBSCRIBE, NOBLOCK, POLLIN
 from .signals import is_stopped
 
 _TOPIC_ENCODING = 'UTF-8'
 _LINE_ENCODING = 'UTF-8'
 
 
-def _multipart_message(topic: str, line: str):
+def _endpoint(address: str) -> str:
+    # plain addresses are TCP, but full endpoints like inproc://... are
+    # passed through, e.g. for benchmarks within one process
+    return address if '://' in address else 'tcp://' + address
+
+
+def _multipart_message(topic: str, line: Union[str, bytes]):
+    if isinstance(line, bytes):
+        data = line.rstrip(b'\n\r')
+    else:
+        data = line.rstrip('\n\r').encode(
+            encoding=_LINE_ENCODING, errors='ignore')
+    return [
+        topic.encode(encoding=_TOPIC_ENCODING, errors='ignore'),
+        data
+    ]
+
+
+def _frame_bytes(frame) -> bytes:
+    # frames received with copy=False are zmq.Frame objects
+    return frame if isinstance(frame, bytes) else frame.bytes
+
+
+def _multipart_lines_message(topic: str, lines: Sequence[Union[str, bytes]]):
+    data = b'\n'.join(
+        line if isinstance(line, bytes)
+        else line.encode(encoding=_LINE_ENCODING, errors='ignore')
+        for line in lines)
     return [
         topic.encode(encoding=_TOPIC_ENCODING, errors='ignore'),
-        line.encode(encoding=_LINE_ENCODING, errors='ignore')
+        data
     ]
 
 
@@ -40,7 +72,7 @@ class Broadcaster(object):
                  ctx: Optional[Context] = None):
         self._ctx = ctx or Context.instance()
         self._socket = self._ctx.socket(PUB)
-        self._socket.bind('tcp://' + bind_address)
+        self._socket.bind(_endpoint(bind_address))
 
     def __enter__(self):
         return self
@@ -48,7 +80,7 @@ class Broadcaster(object):
     def __exit__(self):
         self.close()
 
-    def send(self, topic: str, line: str):
+    def send(self, topic: str, line: Union[str, bytes]):
         """
         Broadcasts the given text line.
 
@@ -58,18 +90,38 @@ class Broadcaster(object):
 
         :param line:
             The text line.
-        :type line: str
+            If it is given as `bytes`, it must be UTF-8 encoded
+            and is sent without transcoding.
+        :type line: Union[str, bytes]
+        """
+        data = _multipart_message(topic, line)
+        self._socket.send_multipart(data)
+
+    def send_lines(self, topic: str, lines: Sequence[Union[str, bytes]]):
+        """
+        Broadcasts multiple text lines in one message.
+
+        :param topic:
+            The topic association of the text lines.
+            E.g. ``log|lines|<source>|<file>``.
+        :type topic: str
+
+        :param lines:
+            The text lines, without line breaks.
+            Lines given as `bytes` must be UTF-8 encoded.
+        :type lines: Sequence[Union[str, bytes]]
         """
-        data = _multipart_message(topic, line.rstrip('\n\r'))
+        data = _multipart_lines_message(topic, lines)
         self._socket.send_multipart(data)
 
     def send_raw(self, data: Sequence[bytes]):
         """
         Broadcasts a raw multipart message.
+        Frames received with ``copy=False`` are forwarded without copying.
 
         :param data:
             A raw multipart message.
-        :type data: Sequence[bytes]
+        :type data: Sequence[Union[bytes, zmq.Frame]]
         """
         self._socket.send_multipart(data)
 
@@ -103,7 +155,7 @@ class Transmitter(object):
         self._ctx = ctx or Context.instance()
         self._socket = self._ctx.socket(PUSH)
         for address in connect_addresses:
-            self._socket.connect('tcp://' + address)
+            self._socket.connect(_endpoint(address))
 
     def __enter__(self):
         return self
@@ -111,7 +163,7 @@ class Transmitter(object):
     def __exit__(self):
         self.close()
 
-    def send(self, topic: str, line: str):
+    def send(self, topic: str, line: Union[str, bytes]):
         """
         Transmits the given text line.
 
@@ -121,18 +173,38 @@ class Transmitter(object):
 
         :param line:
             The text line.
-        :type line: str
+            If it is given as `bytes`, it must be UTF-8 encoded
+            and is sent without transcoding.
+        :type line: Union[str, bytes]
+        """
+        data = _multipart_message(topic, line)
+        self._socket.send_multipart(data)
+
+    def send_lines(self, topic: str, lines: Sequence[Union[str, bytes]]):
+        """
+        Transmits multiple text lines in one message.
+
+        :param topic:
+            The topic association of the text lines.
+            E.g. ``log|lines|<source>|<file>``.
+        :type topic: str
+
+        :param lines:
+            The text lines, without line breaks.
+            Lines given as `bytes` must be UTF-8 encoded.
+        :type lines: Sequence[Union[str, bytes]]
         """
-        data = _multipart_message(topic, line.rstrip('\n\r'))
+        data = _multipart_lines_message(topic, lines)
         self._socket.send_multipart(data)
 
     def send_raw(self, data: Sequence[bytes]):
         """
         Transmits a raw multipart message.
+        Frames received with ``copy=False`` are forwarded without copying.
 
         :param data:
             A raw multipart message.
-        :type data: Sequence[bytes]
+        :type data: Sequence[Union[bytes, zmq.Frame]]
         """
         self._socket.send_multipart(data)
 
@@ -151,14 +223,18 @@ class Listener(object):
     and/or waits for connections from ZeroMQ PUSH sockets;
     passing received log messages to a callback.
 
+    Messages of the type ``lines``, carrying a batch of
+    newline-separated lines, are passed to the callback line by line.
+
     :param handler:
         A function which is called every time a log message is received;
         this is called with `source`, `filename`, and `line` arguments.
 
         Alternatively an object with a method
         ``notify_line(source, filename, line)``
-        and optionally the methods ``notify_watch(source, filename)`` and
-        ``notify_unwatch(source, filename)``.
+        and optionally the methods ``notify_watch(source, filename)``,
+        ``notify_unwatch(source, filename)``, and
+        ``notify_truncate(source, filename)``.
     :type handler: Optional[Union[Callable[[str, str, str], None], Any]]
 
     :param watch_cb:
@@ -173,11 +249,28 @@ class Listener(object):
         this is called with a `filename` argument.
     :type unwatch_cb: Optional[Callable[[str, str], None]]
 
+    :param truncate_cb:
+        A function which is called every time a watched file
+        was truncated and is read again from the beginning;
+        this is called with `source` and `filename` arguments.
+    :type truncate_cb: Optional[Callable[[str, str], None]]
+
     :param raw_cb:
         A function which is called on every received message.
         This is called with a sequence of `bytes`; the raw multi-message.
     :type raw_cb: Optional[Callable[[Sequence[bytes]], None]]
 
+    :param raw_batch_cb:
+        A function which is called with a list of all raw messages,
+        received from one socket in one iteration.
+    :type raw_batch_cb: Optional[Callable[[List[Sequence[bytes]]], None]]
+
+    :param flush_cb:
+        A function which is called after every iteration of
+        :py:meth:`listen`, when all received messages have been handled,
+        or the timeout for waiting has passed.
+    :type flush_cb: Optional[Callable[[], None]]
+
     :param bind_address:
         An IP and port to bind the ZeroMQ PULL socket to.
         E.g. ``127.0.0.1:9000``.
@@ -193,6 +286,17 @@ class Listener(object):
         before handling possible interruption.
     :type interval: float
 
+    :param max_batch:
+        The maximum number of messages to receive from one socket
+        in one iteration, before the other socket gets its turn.
+    :type max_batch: int
+
+    :param copy:
+        If `False`, messages are received without copying the frames,
+        and the raw callbacks get ``zmq.Frame`` objects instead of `bytes`,
+        which can be forwarded without copying them.
+    :type copy: bool
+
     :param ctx:
         An existing ZeroMQ context to use for the IO work.
         If `None` uses the default singleton instance.
@@ -207,42 +311,69 @@ class Listener(object):
                  bind_address: Optional[str] = None,
                  connect_addresses: Optional[Iterable[str]] = None,
                  interval: float = 0.1,
-                 ctx: Optional[Context] = None):
+                 ctx: Optional[Context] = None,
+                 raw_batch_cb: Optional[Callable[[List[Sequence[bytes]]], None]] = None,
+                 max_batch: int = 1000,
+                 copy: bool = True,
+                 flush_cb: Optional[Callable[[], None]] = None,
+                 truncate_cb: Optional[Callable[[str, str], None]] = None):
         self._bind_address = bind_address
-        self._connect_addresses = list(connect_addresses)
+        self._connect_addresses = list(connect_addresses or [])
         if handler \
                 and hasattr(handler, 'notify_line') \
                 and callable(getattr(handler, 'notify_line')):
             # treat handler as an object with notify_* methods
             self._line_cb = handler.notify_line
-            self._watch = getattr(handler, 'notify_watch', watch_cb)
-            self._unwatch = getattr(handler, 'notify_unwatch', unwatch_cb)
+            self._watch_cb = getattr(handler, 'notify_watch', watch_cb)
+            self._unwatch_cb = getattr(handler, 'notify_unwatch', unwatch_cb)
+            self._truncate_cb = getattr(handler, 'notify_truncate', truncate_cb)
         else:
             # otherwise treat it as the handler function for lines
             self._line_cb = handler
             self._watch_cb = watch_cb
             self._unwatch_cb = unwatch_cb
+            self._truncate_cb = truncate_cb
         self._raw_cb = raw_cb
+        self._raw_batch_cb = raw_batch_cb
+        self._flush_cb = flush_cb
+        self._max_batch = max(1, max_batch)
+        self._copy = copy
         self._interval = interval
         self._ctx = ctx or Context.instance()
         self._sub_socket = None
         self._pull_socket = None
+        self._stopped = False
+
+    def stop(self):
+        """
+        Stops a call to :py:meth:`listen` after the current iteration.
+        Can be called from a handler or another thread.
+        """
+        self._stopped = True
 
     def _handle_message(self, data):
         if self._raw_cb:
             self._raw_cb(data)
         if self._line_cb is None \
                 and self._watch_cb is None \
-                and self._unwatch_cb is None:
+                and self._unwatch_cb is None \
+                and self._truncate_cb is None:
             return
-        topic = data[0].decode(encoding=_TOPIC_ENCODING).split('|')
+        topic = _frame_bytes(data[0]).decode(encoding=_TOPIC_ENCODING).split('|')
         msg_type = topic[1]
         if msg_type == 'line':
             source_name = topic[2]
             file_name = topic[3]
-            text = data[1].decode(encoding=_LINE_ENCODING)
+            text = _frame_bytes(data[1]).decode(encoding=_LINE_ENCODING, errors='ignore')
             if callable(self._line_cb):
                 self._line_cb(source_name, file_name, text)
+        elif msg_type == 'lines':
+            source_name = topic[2]
+            file_name = topic[3]
+            text = _frame_bytes(data[1]).decode(encoding=_LINE_ENCODING, errors='ignore')
+            if callable(self._line_cb):
+                for line in text.split('\n'):
+                    self._line_cb(source_name, file_name, line)
         elif msg_type == 'watch':
             source_name = topic[2]
             file_name = topic[3]
@@ -253,12 +384,38 @@ class Listener(object):
             file_name = topic[3]
             if callable(self._unwatch_cb):
                 self._unwatch_cb(source_name, file_name)
+        elif msg_type == 'truncate':
+            source_name = topic[2]
+            file_name = topic[3]
+            if callable(self._truncate_cb):
+                self._truncate_cb(source_name, file_name)
+
+    def _receive_batch(self, socket):
+        """
+        Receives all pending messages from a socket,
+        up to the maximum batch size.
+        """
+        batch = []
+        for _ in range(self._max_batch):
+            try:
+                batch.append(socket.recv_multipart(flags=NOBLOCK,
+                                                   copy=self._copy))
+            except Again:
+                break
+        return batch
+
+    def _handle_batch(self, batch):
+        if self._raw_batch_cb:
+            self._raw_batch_cb(batch)
+        for data in batch:
+            self._handle_message(data)
 
     def listen(self, topics: Iterable[str] = ("log|",)):
         """
         Listens to incoming log messages on the ZeroMQ socket(s).
         Blocks until `Ctrl + C` is pressed,
-        or ``SIGINT`` or ``SIGTERM`` is received by the process.
+        ``SIGINT`` or ``SIGTERM`` is received by the process,
+        or :py:meth:`stop` is called.
 
         Returns immediately if either a bind address nor at least
         one connect address is set.
@@ -274,7 +431,7 @@ class Listener(object):
         poller = Poller()
         if self._bind_address:
             self._pull_socket = self._ctx.socket(PULL)
-            self._pull_socket.bind('tcp://' + self._bind_address)
+            self._pull_socket.bind(_endpoint(self._bind_address))
             poller.register(self._pull_socket, POLLIN)
         if self._connect_addresses:
             self._sub_socket = self._ctx.socket(SUB)
@@ -282,19 +439,19 @@ class Listener(object):
                 self._sub_socket.setsockopt(
                     SUBSCRIBE, topic.encode(encoding=_TOPIC_ENCODING))
             for address in self._connect_addresses:
-                self._sub_socket.connect('tcp://' + address)
+                self._sub_socket.connect(_endpoint(address))
             poller.register(self._sub_socket, POLLIN)
         try:
-            while not is_stopped():
+            while not self._stopped and not is_stopped():
                 events = dict(poller.poll(self._interval * 1000))
                 if self._pull_socket in events \
                         and events[self._pull_socket] == POLLIN:
-                    data = self._pull_socket.recv_multipart(flags=NOBLOCK)
-                    self._handle_message(data)
+                    self._handle_batch(self._receive_batch(self._pull_socket))
                 if self._sub_socket in events \
                         and events[self._sub_socket] == POLLIN:
-                    data = self._sub_socket.recv_multipart(flags=NOBLOCK)
-                    self._handle_message(data)
+                    self._handle_batch(self._receive_batch(self._sub_socket))
+                if self._flush_cb:
+                    self._flush_cb()
         finally:
             if self._pull_socket:
                 self._pull_socket.close()
@@ -302,3 +459,232 @@ class Listener(object):
             if self._sub_socket:
                 self._sub_socket.close()
                 self._sub_socket = None
+
+
+class ProxyDevice(object):
+    """
+    Forwards log messages from a ZeroMQ PULL or SUB socket
+    to a ZeroMQ PUB or PUSH socket natively inside of libzmq,
+    without passing the messages through Python.
+
+    The sockets are created, bound, and connected by :py:meth:`start`
+    in the calling thread, so errors like an address already in use
+    are raised to the caller.
+    The forwarding runs with ``zmq.proxy_steerable()`` in a background
+    thread and is terminated via a control socket.
+    Exactly one of `bind_address` and `connect_addresses`,
+    and exactly one of `frontend_bind_address` and
+    `frontend_connect_addresses` must be given.
+
+    If `capture` is active, libzmq sends a copy of every message
+    to an in-process socket, which is read by :py:meth:`run`.
+    The capture socket blocks, when its queue of `capture_hwm` messages
+    is full, so if counting in Python can not keep up,
+    the forwarding is throttled to the speed of the counting.
+
+    :param bind_address:
+        An IP and port to bind the ZeroMQ PULL socket to.
+    :type bind_address: Optional[str]
+
+    :param connect_addresses:
+        An iterable of addresses to connect the ZeroMQ SUB socket to.
+    :type connect_addresses: Optional[Iterable[str]]
+
+    :param frontend_bind_address:
+        An IP and port to bind the ZeroMQ PUB socket to.
+    :type frontend_bind_address: Optional[str]
+
+    :param frontend_connect_addresses:
+        An iterable of addresses to connect the ZeroMQ PUSH socket to.
+    :type frontend_connect_addresses: Optional[Iterable[str]]
+
+    :param capture:
+        If `True`, a copy of every message is passed to a capture socket,
+        for counting the forwarded messages and bytes.
+    :type capture: bool
+
+    :param ctx:
+        An existing ZeroMQ context to use for the IO work.
+        If `None` uses the default singleton instance.
+    :type ctx: Optional[zmq.Context]
+
+    :param capture_hwm:
+        The maximum number of captured messages,
+        which are queued before the forwarding blocks.
+    :type capture_hwm: int
+    """
+
+    def __init__(self,
+                 bind_address: Optional[str] = None,
+                 connect_addresses: Optional[Iterable[str]] = None,
+                 frontend_bind_address: Optional[str] = None,
+                 frontend_connect_addresses: Optional[Iterable[str]] = None,
+                 capture: bool = False,
+                 ctx: Optional[Context] = None,
+                 capture_hwm: int = 100000):
+        connect_addresses = list(connect_addresses or [])
+        frontend_connect_addresses = list(frontend_connect_addresses or [])
+        if bool(bind_address) == bool(connect_addresses):
+            raise ValueError('The native proxy supports exactly one '
+                             'backend socket.')
+        if bool(frontend_bind_address) == bool(frontend_connect_addresses):
+            raise ValueError('The native proxy supports exactly one '
+                             'frontend socket.')
+        self._bind_address = bind_address
+        self._connect_addresses = connect_addresses
+        self._frontend_bind_address = frontend_bind_address
+        self._frontend_connect_addresses = frontend_connect_addresses
+        self._ctx = ctx or Context.instance()
+        self._endpoint = 'inproc://logsweet-proxy-{:x}'.format(id(self))
+        self._capture = capture
+        self._capture_hwm = capture_hwm
+        self._thread = None
+        self._sockets = []
+        self._control_socket = None
+        self._capture_socket = None
+        self._error = None
+        self.messages = 0
+        self.bytes = 0
+
+    def _socket(self, socket_type):
+        socket = self._ctx.socket(socket_type)
+        self._sockets.append(socket)
+        return socket
+
+    def _close_sockets(self):
+        for socket in self._sockets:
+            socket.close(linger=0)
+        self._sockets = []
+        self._control_socket = None
+        self._capture_socket = None
+
+    def _create_sockets(self):
+        if self._bind_address:
+            backend = self._socket(PULL)
+            backend.bind(_endpoint(self._bind_address))
+        else:
+            backend = self._socket(SUB)
+            backend.setsockopt(SUBSCRIBE, b'log|')
+            for address in self._connect_addresses:
+                backend.connect(_endpoint(address))
+        if self._frontend_bind_address:
+            frontend = self._socket(PUB)
+            frontend.bind(_endpoint(self._frontend_bind_address))
+        else:
+            frontend = self._socket(PUSH)
+            for address in self._frontend_connect_addresses:
+                frontend.connect(_endpoint(address))
+        self._control_socket = self._socket(PAIR)
+        self._control_socket.bind(self._endpoint + '-control')
+        control = self._socket(PAIR)
+        control.connect(self._endpoint + '-control')
+        capture = None
+        if self._capture:
+            self._capture_socket = self._socket(PULL)
+            self._capture_socket.set_hwm(self._capture_hwm)
+            self._capture_socket.bind(self._endpoint + '-capture')
+            capture = self._socket(PUSH)
+            capture.set_hwm(self._capture_hwm)
+            capture.connect(self._endpoint + '-capture')
+        return backend, frontend, capture, control
+
+    def _run(self, sockets):
+        try:
+            proxy_steerable(*sockets)
+        except ZMQError as e:
+            self._error = e
+
+    def start(self):
+        """
+        Creates the sockets and starts forwarding messages
+        in a background thread.
+
+        Raises a `zmq.ZMQError` if a socket can not be bound or connected.
+        """
+        if self._thread:
+            return
+        try:
+            sockets = self._create_sockets()
+        except ZMQError:
+            self._close_sockets()
+            raise
+        self._error = None
+        self._thread = Thread(target=self._run, args=(sockets,),
+                              name='logsweet-proxy', daemon=True)
+        self._thread.start()
+
+    def _count_captured(self, timeout):
+        if not self._capture_socket.poll(timeout * 1000):
+            return
+        while True:
+            try:
+                frames = self._capture_socket.recv_multipart(
+                    flags=NOBLOCK, copy=False)
+            except Again:
+                return
+            self.messages += 1
+            self.bytes += sum(len(f) for f in frames)
+
+    def run(self, interval: float = 0.1):
+        """
+        Starts forwarding and blocks until `Ctrl + C` is pressed,
+        or ``SIGINT`` or ``SIGTERM`` is received by the process.
+
+        :param interval:
+            The timeout in seconds when waiting for captured messages
+            before handling possible interruption.
+        :type interval: float
+        """
+        self.start()
+        try:
+            while not is_stopped() and self._thread.is_alive():
+                if self._capture_socket:
+                    self._count_captured(interval)
+                else:
+                    sleep(interval)
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 5.0) -> bool:
+        """
+        Stops forwarding messages and closes all sockets.
+
+        Raises the `zmq.ZMQError`, which terminated the forwarding,
+        if it did not end because of this call.
+
+        :param timeout:
+            The maximum time in seconds to wait for
+            the forwarding thread to end.
+        :type timeout: float
+
+        :return:
+            `True` if the forwarding ended;
+            `False` if the forwarding thread did not end in time,
+            in this case the sockets are left open.
+        """
+        if not self._thread:
+            return True
+        if self._thread.is_alive():
+            try:
+                self._control_socket.send(b'TERMINATE', flags=NOBLOCK)
+            except Again:
+                # the proxy has not yet consumed an earlier command
+                pass
+        deadline = time() + timeout
+        while self._thread.is_alive() and time() < deadline:
+            if self._capture_socket:
+                # the proxy may block on a full capture queue
+                # and would never read the terminate command
+                self._count_captured(0.05)
+            else:
+                self._thread.join(0.05)
+        if self._thread.is_alive():
+            return False
+        self._thread = None
+        if self._capture_socket:
+            self._count_captured(0)
+        self._close_sockets()
+        if self._error:
+            error, self._error = self._error, None
+            raise error
+        return True
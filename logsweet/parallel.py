@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains the functionality to process received lines
+according to a configuration in parallel worker processes.
+"""
+
+from typing import Any, Callable, Optional, Sequence, Tuple
+import os
+from collections import deque
+from multiprocessing import get_context
+from .config import Configuration
+
+# the configuration of a worker process
+_config = None
+
+
+def _init_worker(config_file, exec_actions):
+    global _config
+    _config = Configuration(config_file, exec_actions)
+
+
+def _process_events(events):
+    results = []
+    for event in events:
+        if event[0] == 'line':
+            line = _config.process(event[3])
+            if line is None:
+                continue
+            event = (event[0], event[1], event[2], line)
+        results.append(event)
+    return results
+
+
+class ProcessingPool(object):
+    """
+    Processes batches of events with a
+    :py:class:`logsweet.config.Configuration` in a pool of worker processes.
+    Every worker loads its own configuration.
+
+    An event is a tuple with the event type, the source name,
+    the file name, and for the event type ``line`` the text line.
+    Lines are processed by the workers, lines which are dropped
+    by the configuration are removed, and all other events
+    are passed through unchanged.
+    The processed events are passed to the callback
+    in the order their batches were submitted.
+    This is a global ordering over all sources and files:
+    it preserves the order of the lines per file,
+    but a slow batch also delays the output of all other files.
+
+    The workers are started with the ``spawn`` method,
+    because forking a process with running ZeroMQ IO threads is unsafe.
+
+    :param config_file:
+        The name of a YAML configuration file.
+    :type config_file: str
+
+    :param exec_actions:
+        A switch to activate the execution of actions.
+    :type exec_actions: bool
+
+    :param handler:
+        A function which is called with every processed event,
+        which was not dropped.
+    :type handler: Callable[[Tuple[Any, ...]], None]
+
+    :param workers:
+        The number of worker processes.
+        If `None` defaults to the number of CPUs.
+    :type workers: Optional[int]
+
+    :param max_pending:
+        The maximum number of batches being processed,
+        before :py:meth:`submit` blocks.
+        If `None` defaults to four times the number of workers.
+    :type max_pending: Optional[int]
+
+    :param chunk_size:
+        The maximum number of events in one batch.
+        Larger batches are split, so they are spread across the workers.
+    :type chunk_size: int
+    """
+
+    def __init__(self, config_file: str, exec_actions: bool,
+                 handler: Callable[[Tuple[Any, ...]], None],
+                 workers: Optional[int] = None,
+                 max_pending: Optional[int] = None,
+                 chunk_size: int = 500):
+        self._pool = get_context('spawn').Pool(
+            workers, initializer=_init_worker,
+            initargs=(config_file, exec_actions))
+        self._handler = handler
+        self._chunk_size = max(1, chunk_size)
+        self._pending = deque()
+        self._max_pending = max_pending or \
+            4 * (workers or os.cpu_count() or 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, events: Sequence[Tuple[Any, ...]]):
+        """
+        Submits a batch of events for processing,
+        and passes the results of already processed batches to the handler.
+
+        :param events:
+            A sequence of event tuples.
+        :type events: Sequence[Tuple[Any, ...]]
+        """
+        for i in range(0, len(events), self._chunk_size):
+            while len(self._pending) >= self._max_pending:
+                self._deliver(self._pending.popleft().get())
+            chunk = list(events[i:i + self._chunk_size])
+            self._pending.append(
+                self._pool.apply_async(_process_events, (chunk,)))
+        self.collect()
+
+    def collect(self, block: bool = False):
+        """
+        Passes the results of processed batches to the handler,
+        as long as the oldest pending batch is ready.
+
+        :param block:
+            If `True`, waits until all pending batches are processed.
+        :type block: bool
+        """
+        while self._pending and (block or self._pending[0].ready()):
+            self._deliver(self._pending.popleft().get())
+
+    def _deliver(self, events):
+        for event in events:
+            self._handler(event)
+
+    def close(self):
+        """
+        Waits for all pending batches and stops the worker processes.
+        """
+        try:
+            self.collect(block=True)
+        finally:
+            self._pool.terminate()
+            self._pool.join()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains helpers for matching a text line
+against many regular expressions efficiently.
+"""
+
+from typing import Any, Iterable, Sequence, List, Optional, Pattern
+import re
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# constructs which change their meaning when a pattern is embedded
+# into an alternation with other patterns:
+# numbered and named backreferences, conditional groups,
+# and global inline flags
+_UNMERGEABLE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)')
+
+
+def is_mergeable(pattern: str) -> bool:
+    """
+    Checks whether a regular expression can safely be merged
+    with other expressions into one alternation.
+
+    :param pattern:
+        A regular expression.
+    :type pattern: str
+
+    :return: bool
+    """
+    return not _UNMERGEABLE.search(pattern)
+
+
+def combine_patterns(patterns: Sequence[str]) -> List[Pattern]:
+    """
+    Compiles a list of regular expressions into as few patterns as possible.
+    All expressions, which can be merged safely,
+    are combined into one alternation;
+    the others are compiled individually.
+
+    A text line matches any of the given expressions,
+    if it matches any of the returned patterns.
+    Every expression is validated on its own,
+    so an invalid expression raises ``re.error`` like ``re.compile()``.
+
+    :param patterns:
+        A sequence of regular expressions.
+    :type patterns: Sequence[str]
+
+    :return: A list with compiled patterns.
+    """
+    compiled = [re.compile(p) for p in patterns]
+    mergeable = [p for p in patterns if is_mergeable(p)]
+    if len(mergeable) < 2:
+        return compiled
+    try:
+        combined = re.compile('|'.join('(?:{})'.format(p) for p in mergeable))
+    except re.error:
+        # e.g. the same group name in multiple patterns
+        return compiled
+    return [combined] + [c for p, c in zip(patterns, compiled)
+                         if not is_mergeable(p)]
+
+
+_OPAQUE = (None, '', '', [])
+
+
+def _analyze_item(op, av):
+    """
+    Analyzes one parsed item of a regular expression.
+    See :py:func:`_analyze`.
+    """
+    if op is sre_parse.LITERAL:
+        return chr(av), chr(av), chr(av), []
+    if op is sre_parse.AT:
+        # anchors do not consume characters
+        return '', '', '', []
+    if op is sre_parse.SUBPATTERN:
+        # av is (group, p) or (group, add_flags, del_flags, p)
+        if len(av) == 4 and av[1] & sre_parse.SRE_FLAG_IGNORECASE:
+            return _OPAQUE
+        return _analyze(av[-1])
+    if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+        exact, prefix, suffix, runs = _analyze(av[2])
+        if av[0] == av[1] == 1:
+            return exact, prefix, suffix, runs
+        # the repeated expression occurs at least once:
+        # the first repetition starts and the last one ends the item
+        return None, prefix, suffix, runs + [prefix, suffix]
+    return _OPAQUE
+
+
+def _analyze(items):
+    """
+    Analyzes a sequence of parsed items of a regular expression.
+
+    Returns a tuple with the exact string, if the sequence consists
+    of literals only, or `None`; the literal run every match starts with;
+    the literal run every match ends with;
+    and a list with literal runs every match contains.
+    """
+    exact = ''
+    prefix = None
+    run = ''
+    runs = []
+    for op, av in items:
+        item_exact, item_prefix, item_suffix, item_runs = _analyze_item(op, av)
+        if item_exact is not None:
+            run += item_exact
+            continue
+        if prefix is None:
+            prefix = run + item_prefix
+        runs.append(run + item_prefix)
+        runs.extend(item_runs)
+        run = item_suffix
+        exact = None
+    if exact is not None:
+        return run, run, run, []
+    runs.append(run)
+    return None, prefix, run, runs
+
+
+def required_literal(pattern: Optional[Pattern]) -> Optional[str]:
+    """
+    Extracts the longest literal string, which is part of every match
+    of a regular expression.
+
+    :param pattern:
+        A compiled regular expression.
+    :type pattern: Optional[Pattern]
+
+    :return:
+        A string which must be contained in every line matching the
+        expression, or `None` if no such string could be determined.
+    """
+    if pattern is None or pattern.flags & re.IGNORECASE:
+        return None
+    try:
+        items = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+    exact, prefix, suffix, runs = _analyze(items)
+    literal = exact if exact is not None else max(runs, key=len)
+    return literal or None
+
+
+class RuleSet(object):
+    """
+    An ordered set of rules with a literal prefilter.
+
+    Every rule must provide an attribute `literal`,
+    with a string which is contained in every line the rule can match,
+    or `None`. All literals are merged into one alternation,
+    so a line, which contains none of them, is rejected for all rules
+    with a literal in a single scan.
+
+    :param rules:
+        An iterable with rules, e.g.
+        :py:class:`logsweet.colors.ColorRule` or
+        :py:class:`logsweet.actions.HttpActionRule`.
+    :type rules: Iterable[Any]
+    """
+
+    def __init__(self, rules: Iterable[Any]):
+        self._rules = list(rules)
+        self._unconditional = [r for r in self._rules if not r.literal]
+        literals = sorted(set(r.literal for r in self._rules if r.literal),
+                          key=len, reverse=True)
+        self._prefilter = re.compile('|'.join(map(re.escape, literals))) \
+            if literals else None
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __iter__(self):
+        return iter(self._rules)
+
+    def candidates(self, line: str) -> List[Any]:
+        """
+        Selects the rules, which can possibly match the given line,
+        preserving their order.
+
+        :param line:
+            A text line.
+        :type line: str
+
+        :return: A list with rules.
+        """
+        if self._prefilter is None or not self._prefilter.search(line):
+            return self._unconditional
+        return [r for r in self._rules if not r.literal or r.literal in line]
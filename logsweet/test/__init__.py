@@ -1 +1,34 @@
 # -*- coding: utf-8 -*-
+import os
+import tempfile
+
+CONFIG = """
+version: '0.1'
+exclude: DEBUG
+colors:
+  - pattern: ERROR
+    line: red
+  - pattern: '\\d+'
+    line: blue
+watch:
+  - /var/log/*.log
+  - glob: /var/log/nginx/*.log
+    encoding: latin-1
+    tail: 10
+    tag: nginx
+"""
+
+
+class ConfigFileMixin(object):
+    """
+    Writes :py:data:`CONFIG` into a temporary YAML file
+    for the duration of a test, and stores its name in `config_file`.
+    """
+
+    def setUp(self):
+        fd, self.config_file = tempfile.mkstemp(suffix='.yml')
+        with os.fdopen(fd, 'w') as f:
+            f.write(CONFIG)
+
+    def tearDown(self):
+        os.remove(self.config_file)
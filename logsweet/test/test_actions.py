@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+from concurrent.futures import Future
+from ..actions import ActionDispatcher, HttpActionRule, RateLimiter
+
+
+class Response(object):
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class MockSession(object):
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        future = Future()
+        self.requests.append((url, future))
+        return future
+
+    def close(self):
+        pass
+
+
+class TestActionDispatcher(TestCase):
+
+    def setUp(self):
+        self.session = MockSession()
+
+    def test_counters(self):
+        d = ActionDispatcher(session=self.session)
+        self.assertTrue(d.dispatch('http://a/1', 1.0))
+        self.assertTrue(d.dispatch('http://a/2', 1.0))
+        self.assertTrue(d.dispatch('http://a/3', 1.0))
+        self.session.requests[0][1].set_result(Response(200))
+        self.session.requests[1][1].set_result(Response(500))
+        self.session.requests[2][1].set_exception(IOError('timeout'))
+        self.assertEqual(d.stats(), {'sent': 1, 'failed': 2,
+                                     'dropped': 0, 'coalesced': 0})
+
+    def test_drop_on_overflow(self):
+        d = ActionDispatcher(concurrency=1, queue_size=1,
+                             session=self.session)
+        self.assertTrue(d.dispatch('http://a/1', 1.0))
+        self.assertTrue(d.dispatch('http://a/2', 1.0))
+        self.assertFalse(d.dispatch('http://a/3', 1.0))
+        self.assertEqual(d.dropped, 1)
+        self.session.requests[0][1].set_result(Response(200))
+        self.assertTrue(d.dispatch('http://a/4', 1.0))
+        self.assertEqual(len(self.session.requests), 3)
+
+    def test_coalesce(self):
+        d = ActionDispatcher(coalesce=60.0, session=self.session)
+        self.assertTrue(d.dispatch('http://a/1', 1.0))
+        self.assertFalse(d.dispatch('http://a/1', 1.0))
+        self.assertTrue(d.dispatch('http://a/2', 1.0))
+        self.assertEqual(d.coalesced, 1)
+        self.assertEqual(len(self.session.requests), 2)
+
+    def test_rate_limit(self):
+        d = ActionDispatcher(session=self.session)
+        limiter = RateLimiter(0.001, burst=2)
+        results = [d.dispatch('http://a/1', 1.0, limiter) for _ in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual(d.dropped, 3)
+
+    def test_invalid_overflow(self):
+        with self.assertRaises(ValueError):
+            ActionDispatcher(overflow='ignore', session=self.session)
+
+
+class TestHttpActionRule(TestCase):
+
+    def test_trigger(self):
+        session = MockSession()
+        d = ActionDispatcher(session=session)
+        rule = HttpActionRule({'pattern': r'ERROR (?P<code>\d+)',
+                               'url': 'http://a/$code',
+                               'rate_limit': 100}, d)
+        self.assertEqual(rule('ERROR 42'), (True, 'ERROR 42'))
+        self.assertEqual(rule('INFO 1'), (False, 'INFO 1'))
+        self.assertEqual([url for url, _ in session.requests], ['http://a/42'])
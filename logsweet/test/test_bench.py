@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import json
+from ..bench import bench_pipeline, run_benchmarks
+
+
+class TestBench(TestCase):
+
+    def test_pipeline(self):
+        result = bench_pipeline(200, transport='inproc', proxy=True,
+                                batch_size=10)
+        self.assertEqual(result['received'], 200)
+        self.assertIn('p99', result['latency_ms'])
+
+    def test_micro_suite(self):
+        results = run_benchmarks(lines=500, suite='micro')
+        names = [r['name'] for r in results['results']]
+        self.assertEqual(names, ['config_process', 'tail',
+                                 'read_lines', 'read_lines'])
+        json.dumps(results)
+
+    def test_invalid_suite(self):
+        with self.assertRaises(ValueError):
+            run_benchmarks(suite='unknown')
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+from ..checkpoint import CheckpointStore
+from ..watch import LogWatcher
+
+
+class TestCheckpointStore(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'checkpoint.json')
+        self.log = os.path.join(self.dir, 'a.log')
+        with open(self.log, 'w') as f:
+            f.write('foo\nbar\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_resume_offset(self):
+        with CheckpointStore(self.path) as store:
+            self.assertFalse(store.existed)
+            store.update('1', self.log, 4, 1)
+        with CheckpointStore(self.path) as store:
+            self.assertTrue(store.existed)
+            self.assertEqual(store.resume_offset('1', self.log), 4)
+            self.assertIsNone(store.resume_offset('2', self.log))
+
+    def test_changed_file(self):
+        with CheckpointStore(self.path) as store:
+            store.update('1', self.log, 8, 2)
+        with open(self.log, 'w') as f:
+            f.write('baz\nbar\n')
+        with CheckpointStore(self.path) as store:
+            self.assertEqual(store.resume_offset('1', self.log), 0)
+
+    def test_truncated_file(self):
+        with CheckpointStore(self.path) as store:
+            store.update('1', self.log, 8, 2)
+        with open(self.log, 'w') as f:
+            f.write('foo\n')
+        with CheckpointStore(self.path) as store:
+            self.assertEqual(store.resume_offset('1', self.log), 0)
+
+    def test_rewound_file(self):
+        with CheckpointStore(self.path) as store:
+            store.update('1', self.log, 8, 2)
+        with open(self.log, 'w') as f:
+            f.write('baz\n')
+        with CheckpointStore(self.path) as store:
+            # the watcher detected the truncation and read the new line
+            store.update('1', self.log, 0)
+            store.update('1', self.log, 4, 1)
+        with CheckpointStore(self.path) as store:
+            self.assertEqual(store.resume_offset('1', self.log), 4)
+
+
+class TestLogWatcherCheckpoint(TestCase):
+
+    binary = False
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'checkpoint.json')
+        self.glob = os.path.join(self.dir, '*.log*')
+        self.log = os.path.join(self.dir, 'a.log')
+        self.write(self.log, 'old\n')
+        self.lines = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    @staticmethod
+    def write(file_name, data):
+        with open(file_name, 'a', encoding='UTF-8') as f:
+            f.write(data)
+
+    def run_watcher(self):
+        def callback(file_name, lines):
+            self.lines.extend(
+                line.decode() if isinstance(line, bytes) else line
+                for line in lines)
+
+        with CheckpointStore(self.path) as store:
+            with LogWatcher(self.glob, callback, backend='poll',
+                            encoding='UTF-8', binary=self.binary,
+                            checkpoint=store) as watcher:
+                watcher.watch(blocking=False)
+
+    def test_resume(self):
+        self.run_watcher()
+        self.assertEqual(self.lines, [])
+        self.write(self.log, 'foo\nbar\n')
+        self.run_watcher()
+        self.assertEqual(self.lines, ['foo', 'bar'])
+        self.write(self.log, 'baz\n')
+        self.run_watcher()
+        self.assertEqual(self.lines, ['foo', 'bar', 'baz'])
+
+    def test_rotated_file(self):
+        self.run_watcher()
+        self.write(self.log, 'foo\n')
+        os.rename(self.log, self.log + '.1')
+        self.write(self.log, 'bar\n')
+        self.run_watcher()
+        self.assertEqual(sorted(self.lines), ['bar', 'foo'])
+
+
+class TestBinaryLogWatcherCheckpoint(TestLogWatcherCheckpoint):
+
+    binary = True
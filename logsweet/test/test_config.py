@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+from ..colors import ColorRule
+from ..config import Filter, Configuration
+from ..watch import GlobSpec
+from . import ConfigFileMixin
+
+
+class TestFilter(TestCase):
+
+    def test_no_patterns(self):
+        f = Filter({})
+        self.assertTrue(f('foo'))
+
+    def test_include_exclude(self):
+        f = Filter({'include': ['ERROR', 'WARN'], 'exclude': 'ignore'})
+        self.assertEqual(len(f._include_patterns), 1)
+        self.assertTrue(f('WARN: foo'))
+        self.assertTrue(f('ERROR: foo'))
+        self.assertFalse(f('INFO: foo'))
+        self.assertFalse(f('ERROR: ignore me'))
+
+    def test_unmergeable_patterns(self):
+        f = Filter({'include': [r'(a)\1', '(?i)error', 'warn']})
+        self.assertEqual(len(f._include_patterns), 3)
+        self.assertTrue(f('xaax'))
+        self.assertTrue(f('Error'))
+        self.assertTrue(f('warn'))
+        self.assertFalse(f('ax'))
+
+    def test_duplicate_group_names(self):
+        f = Filter({'exclude': ['(?P<x>a)', '(?P<x>b)']})
+        self.assertFalse(f('a'))
+        self.assertFalse(f('b'))
+        self.assertTrue(f('c'))
+
+
+class TestConfiguration(ConfigFileMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config = Configuration(self.config_file)
+
+    def test_filter(self):
+        self.assertIsNone(self.config.process('DEBUG foo'))
+
+    def test_first_color_rule_wins(self):
+        red = ColorRule({'pattern': 'ERROR', 'line': 'red'})
+        blue = ColorRule({'pattern': r'\d+', 'line': 'blue'})
+        self.assertEqual(self.config.process('1 ERROR'),
+                         red.process('1 ERROR')[1])
+        self.assertEqual(self.config.process('1 INFO'),
+                         blue.process('1 INFO')[1])
+        self.assertEqual(self.config.process('INFO'), 'INFO')
+
+    def test_watch(self):
+        plain, nginx = map(GlobSpec.from_config, self.config.watch)
+        self.assertEqual(plain.pattern, '/var/log/*.log')
+        self.assertIsNone(plain.tag)
+        self.assertEqual((nginx.pattern, nginx.encoding, nginx.tail_lines,
+                          nginx.all_lines, nginx.tag),
+                         ('/var/log/nginx/*.log', 'latin-1', 10, None, 'nginx'))
@@ -1,3 +1,90 @@
 # -*- coding: utf-8 -*-
+from unittest import TestCase
+from unittest.mock import patch
+from ..core import LogWatcherHandler, _check_binary_encoding
 
-# from unittest import TestCase
+
+class MockSender(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, topic, line):
+        self.messages.append((topic, line))
+
+    def send_lines(self, topic, lines):
+        self.messages.append((topic, list(lines)))
+
+
+class TestLogWatcherHandler(TestCase):
+
+    def test_single_lines(self):
+        tm = MockSender()
+        handler = LogWatcherHandler('src', None, False, tm=tm)
+        handler.notify_lines('a.log', ['foo', 'bar'])
+        self.assertEqual(tm.messages, [
+            ('log|line|src|a.log', 'foo'),
+            ('log|line|src|a.log', 'bar'),
+        ])
+
+    def test_batches(self):
+        tm = MockSender()
+        handler = LogWatcherHandler('src', None, False, tm=tm, batch_size=2)
+        handler.notify_lines('a.log', ['1', '2', '3'])
+        self.assertEqual(tm.messages, [
+            ('log|lines|src|a.log', ['1', '2']),
+            ('log|lines|src|a.log', ['3']),
+        ])
+
+    def test_batch_linger(self):
+        tm = MockSender()
+        handler = LogWatcherHandler('src', None, False, tm=tm,
+                                    batch_size=2, batch_linger=60.0)
+        handler.notify_lines('a.log', ['1', '2', '3'])
+        self.assertEqual(tm.messages, [('log|lines|src|a.log', ['1', '2'])])
+        handler.notify_flush()
+        self.assertEqual(len(tm.messages), 1)
+        handler.notify_unwatch('a.log')
+        self.assertEqual(tm.messages[1], ('log|lines|src|a.log', ['3']))
+
+    def test_truncate(self):
+        tm = MockSender()
+        handler = LogWatcherHandler('src', None, False, tm=tm,
+                                    batch_size=2, batch_linger=60.0)
+        handler.notify_lines('a.log', ['1'])
+        handler.notify_truncate('a.log')
+        self.assertEqual(tm.messages, [
+            ('log|lines|src|a.log', ['1']),
+            ('log|truncate|src|a.log', ''),
+        ])
+
+    def test_tag(self):
+        tm = MockSender()
+        handler = LogWatcherHandler('src', None, False, tm=tm)
+        handler.notify_tag('a.log', 'web')
+        handler.notify_lines('a.log', ['foo'])
+        handler.notify_lines('b.log', ['bar'])
+        handler.notify_unwatch('a.log')
+        handler.notify_lines('a.log', ['baz'])
+        self.assertEqual(tm.messages, [
+            ('log|line|web|a.log', 'foo'),
+            ('log|line|src|b.log', 'bar'),
+            ('log|unwatch|web|a.log', ''),
+            ('log|line|src|a.log', 'baz'),
+        ])
+
+
+class TestBinaryEncoding(TestCase):
+
+    def test_explicit_encoding(self):
+        _check_binary_encoding('utf8')
+        with self.assertRaises(ValueError):
+            _check_binary_encoding('latin-1')
+
+    def test_locale_encoding(self):
+        with patch('locale.getpreferredencoding', return_value='UTF-8'):
+            _check_binary_encoding(None)
+        with patch('locale.getpreferredencoding', return_value='cp1252'):
+            with self.assertRaises(ValueError):
+                _check_binary_encoding(None)
+            _check_binary_encoding('UTF-8')
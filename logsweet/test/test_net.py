@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import socket
+from time import time
+import zmq
+from ..net import Listener, ProxyDevice, _endpoint
+
+
+class TestEndpoint(TestCase):
+
+    def test_endpoint(self):
+        self.assertEqual(_endpoint('127.0.0.1:9000'), 'tcp://127.0.0.1:9000')
+        self.assertEqual(_endpoint('inproc://logs'), 'inproc://logs')
+
+
+class TestListener(TestCase):
+
+    def setUp(self):
+        def callback(source, file_name, line):
+            self.lines.append((source, file_name, line))
+
+        self.lines = []
+        self.listener = Listener(handler=callback)
+
+    def test_line_message(self):
+        self.listener._handle_message([b'log|line|src|a.log', b'foo'])
+        self.assertEqual(self.lines, [('src', 'a.log', 'foo')])
+
+    def test_lines_message(self):
+        self.listener._handle_message([b'log|lines|src|a.log', b'foo\nbar'])
+        self.assertEqual(self.lines, [('src', 'a.log', 'foo'),
+                                      ('src', 'a.log', 'bar')])
+
+    def test_truncate_message(self):
+        truncated = []
+        listener = Listener(truncate_cb=lambda s, f: truncated.append((s, f)))
+        listener._handle_message([b'log|truncate|src|a.log', b''])
+        self.assertEqual(truncated, [('src', 'a.log')])
+
+    def test_receive_batch(self):
+        ctx = zmq.Context.instance()
+        pull = ctx.socket(zmq.PULL)
+        pull.bind('inproc://test-receive-batch')
+        push = ctx.socket(zmq.PUSH)
+        push.connect('inproc://test-receive-batch')
+        try:
+            for i in range(5):
+                push.send_multipart([b'log|line|src|a.log', str(i).encode()])
+            listener = Listener(max_batch=3, copy=False)
+            self.assertTrue(pull.poll(1000))
+            batch = listener._receive_batch(pull)
+            self.assertEqual(len(batch), 3)
+            self.assertIsInstance(batch[0][1], zmq.Frame)
+            self.assertEqual(len(listener._receive_batch(pull)), 2)
+            self.assertEqual(listener._receive_batch(pull), [])
+        finally:
+            push.close(linger=0)
+            pull.close(linger=0)
+
+
+def _free_address():
+    s = socket.socket()
+    try:
+        s.bind(('127.0.0.1', 0))
+        return '127.0.0.1:{}'.format(s.getsockname()[1])
+    finally:
+        s.close()
+
+
+class TestProxyDevice(TestCase):
+
+    def setUp(self):
+        self.ctx = zmq.Context.instance()
+        self.backend_address = _free_address()
+        self.pull = self.ctx.socket(zmq.PULL)
+        self.pull.bind('tcp://127.0.0.1:*')
+        self.frontend_address = self.pull.getsockopt_string(
+            zmq.LAST_ENDPOINT)[len('tcp://'):]
+        self.push = self.ctx.socket(zmq.PUSH)
+        self.push.connect('tcp://' + self.backend_address)
+
+    def tearDown(self):
+        self.push.close(linger=0)
+        self.pull.close(linger=0)
+
+    def device(self, **kwargs):
+        return ProxyDevice(
+            bind_address=self.backend_address,
+            frontend_connect_addresses=[self.frontend_address],
+            capture=True, ctx=self.ctx, **kwargs)
+
+    def test_forward(self):
+        device = self.device()
+        device.start()
+        try:
+            messages = [[b'log|line|src|a.log', str(i).encode()]
+                        for i in range(10)]
+            for message in messages:
+                self.push.send_multipart(message)
+            received = []
+            while len(received) < len(messages) and self.pull.poll(2000):
+                received.append(self.pull.recv_multipart())
+            self.assertEqual(received, messages)
+        finally:
+            t = time()
+            self.assertTrue(device.stop())
+            self.assertLess(time() - t, 2.0)
+        self.assertEqual(device.messages, 10)
+        self.assertEqual(device.bytes,
+                         sum(len(f) for m in messages for f in m))
+
+    def test_stop_with_full_capture(self):
+        device = self.device(capture_hwm=1)
+        device.start()
+        for i in range(100):
+            self.push.send_multipart([b'log|line|src|a.log', b'x'])
+        # the proxy blocks, because nobody counts the captured messages
+        self.assertTrue(self.pull.poll(2000))
+        self.assertTrue(device.stop(timeout=2.0))
+        self.assertGreater(device.messages, 0)
+
+    def test_start_error(self):
+        blocker = self.ctx.socket(zmq.PULL)
+        blocker.bind('tcp://' + self.backend_address)
+        try:
+            device = self.device()
+            with self.assertRaises(zmq.ZMQError):
+                device.start()
+            self.assertTrue(device.stop())
+        finally:
+            blocker.close(linger=0)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+from ..config import Configuration
+from ..parallel import ProcessingPool
+from . import ConfigFileMixin
+
+
+class TestProcessingPool(ConfigFileMixin, TestCase):
+
+    def test_order_and_filter(self):
+        results = []
+        events = [('watch', 'src', 'a.log')] + \
+            [('line', 'src', 'a.log', 'DEBUG {}'.format(i) if i % 3 == 0
+              else 'INFO {}'.format(i)) for i in range(100)]
+        with ProcessingPool(self.config_file, False, results.append,
+                            workers=2, chunk_size=7) as pool:
+            pool.submit(events[:50])
+            pool.submit(events[50:])
+        config = Configuration(self.config_file)
+        expected = [e if e[0] != 'line' else e[:3] + (config.process(e[3]),)
+                    for e in events]
+        self.assertEqual(results, [e for e in expected if e[-1] is not None])
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import re
+import random
+from ..patterns import required_literal, RuleSet
+
+
+class Rule(object):
+
+    def __init__(self, pattern):
+        self.literal = required_literal(re.compile(pattern))
+
+
+class TestRequiredLiteral(TestCase):
+
+    def literal(self, pattern):
+        return required_literal(re.compile(pattern))
+
+    def test_literal(self):
+        self.assertEqual(self.literal('ERROR'), 'ERROR')
+        self.assertEqual(self.literal(r'^\d+ \[ERROR\]'), ' [ERROR]')
+        self.assertEqual(self.literal('a(?:bc)d'), 'abcd')
+        self.assertEqual(self.literal('(?P<x>foo) bar'), 'foo bar')
+
+    def test_nested_groups(self):
+        self.assertEqual(self.literal('x(y(ab)+)'), 'xyab')
+        self.assertEqual(self.literal(r'\[(?P<lvl>E(RR)+OR)\]'), 'RROR]')
+        self.assertEqual(self.literal('id=(ab+c)'), 'id=ab')
+        self.assertEqual(self.literal('x(ya+b)'), 'xya')
+        self.assertEqual(self.literal('ab(c(de)+f)'), 'abcde')
+
+    def test_no_literal(self):
+        self.assertIsNone(self.literal(r'\d+'))
+        self.assertIsNone(self.literal('foo|bar'))
+        self.assertIsNone(self.literal('(?i)foo'))
+        self.assertIsNone(self.literal('a?'))
+        self.assertIsNone(required_literal(None))
+
+    def test_random_patterns(self):
+        # generates random patterns together with strings matching them,
+        # and checks that every string contains the required literal
+        rnd = random.Random(42)
+
+        def repeat(pattern, quantifiers):
+            quantifier = rnd.choice(quantifiers)
+            low, high = {'': (1, 1), '?': (0, 1), '*': (0, 3), '+': (1, 3),
+                         '{1,2}': (1, 2), '{2}': (2, 2)}[quantifier]
+            return pattern[0] + quantifier, \
+                lambda: ''.join(pattern[1]()
+                                for _ in range(rnd.randint(low, high)))
+
+        def atom(depth):
+            kind = rnd.randrange(4 if depth < 2 else 2)
+            if kind == 0:
+                c = rnd.choice('abc')
+                return repeat((c, lambda: c), ['', '', '+', '*', '?'])
+            if kind == 1:
+                return repeat(rnd.choice([
+                    ('[ab]', lambda: rnd.choice('ab')),
+                    ('.', lambda: rnd.choice('abc')),
+                    (r'\w', lambda: rnd.choice('abc'))]), ['', '+'])
+            if kind == 2:
+                p, g = sequence(depth + 1)
+                group = '(' + p + ')', g
+            else:
+                alternatives = [sequence(depth + 1), sequence(depth + 1)]
+                group = '(?:' + '|'.join(p for p, _ in alternatives) + ')', \
+                    lambda: rnd.choice(alternatives)[1]()
+            return repeat(group, ['', '', '?', '+', '{1,2}', '{2}'])
+
+        def sequence(depth):
+            atoms = [atom(depth) for _ in range(rnd.randint(1, 4))]
+            return ''.join(p for p, _ in atoms), \
+                lambda: ''.join(g() for _, g in atoms)
+
+        for _ in range(2000):
+            pattern, generate = sequence(0)
+            literal = required_literal(re.compile(pattern))
+            if literal is None:
+                continue
+            for _ in range(20):
+                text = generate()
+                self.assertIn(literal, text,
+                              '{} in {}'.format(pattern, text))
+
+
+class TestRuleSet(TestCase):
+
+    def test_candidates(self):
+        a, b, c = Rule('ERROR'), Rule(r'\d+'), Rule('WARN(ING)?')
+        rules = RuleSet([a, b, c])
+        self.assertEqual(rules.candidates('INFO 1'), [b])
+        self.assertEqual(rules.candidates('WARN 1'), [b, c])
+        self.assertEqual(rules.candidates('ERROR WARN'), [a, b, c])
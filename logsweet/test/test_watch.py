@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
-from unittest import TestCase
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
 import atexit
 import os
+import time
+import shutil
+import tempfile
 import locale
-from ..watch import LogWatcher
+import threading
+from .. import inotify
+from ..watch import LogWatcher, ShardedLogWatcher, GlobSpec, _GlobScanner
 
 TESTFN = '$testfile.log'
 TESTFN2 = '$testfile2.log'
@@ -11,6 +17,8 @@ TESTFN2 = '$testfile2.log'
 
 class TestLogWatcher(TestCase):
 
+    backend = 'poll'
+
     def setUp(self):
         def callback(filename, lines):
             self.filename.append(filename)
@@ -20,7 +28,7 @@ class TestLogWatcher(TestCase):
         self.filename = []
         self.lines = []
         self.file = open(TESTFN, 'w', encoding=locale.getpreferredencoding())
-        self.watcher = LogWatcher('./*', callback)
+        self.watcher = LogWatcher('./*', callback, backend=self.backend)
 
     def tearDown(self):
         self.watcher.close()
@@ -95,6 +103,306 @@ class TestLogWatcher(TestCase):
         self.assertRaises(ValueError, self.watcher._tail, self.file.name, -1)
         self.watcher._tail(self.file.name, 10)
 
+    def test_tail_encodings(self):
+        for encoding in ('UTF-8', 'UTF-16'):
+            watcher = LogWatcher(TESTFN2, lambda f, ls: None,
+                                 backend=self.backend, encoding=encoding)
+            try:
+                with open(TESTFN2, 'w', encoding=encoding) as f:
+                    f.write('\u00e4\n\u00f6\r\n\u00fc\n')
+                self.assertEqual(watcher._tail(TESTFN2, 2),
+                                 ['\u00f6', '\u00fc'], encoding)
+                open(TESTFN2, 'w').close()
+                self.assertEqual(watcher._tail(TESTFN2, 2), [], encoding)
+            finally:
+                watcher.close()
+                os.remove(TESTFN2)
+
     def test_ctx_manager(self):
         with self.watcher:
             pass
+
+    def test_adaptive_polling(self):
+        self.watcher._max_poll_interval = 0.08
+        file = next(f for f in self.watcher._files_map.values()
+                    if f.name == os.path.abspath(TESTFN))
+        intervals = []
+        for _ in range(5):
+            self.watcher._poll_file(file, 0.0, 0.01)
+            intervals.append(file.interval)
+        self.assertEqual(intervals, [0.0, 0.01, 0.02, 0.04, 0.08])
+        self.write_file('foo\n')
+        self.watcher._poll_file(file, 0.0, 0.01)
+        self.assertEqual(self.lines, ["foo"])
+        self.assertEqual(file.interval, 0.0)
+        state = self.watcher.poll_state()[os.path.abspath(TESTFN)]
+        self.assertEqual(state['size'], 4)
+        self.assertEqual(state['interval'], 0.0)
+
+    def test_truncate(self):
+        truncated = []
+        self.watcher._truncate_cb = truncated.append
+        self.write_file('foo\nbar\n')
+        self.watcher.watch(blocking=False)
+        # copytruncate keeps the inode
+        self.file.truncate(0)
+        self.file.seek(0)
+        self.write_file('baz\n')
+        self.watcher.watch(blocking=False)
+        self.assertEqual(self.lines, ["foo", "bar", "baz"])
+        self.assertEqual(truncated, [os.path.abspath(TESTFN)])
+
+
+class TestBinaryLogWatcher(TestCase):
+
+    def setUp(self):
+        def callback(filename, lines):
+            self.lines.extend(lines)
+
+        self.lines = []
+        self.file = open(TESTFN, 'wb')
+        self.watcher = LogWatcher('./*', callback, backend='poll',
+                                  binary=True, chunk_size=4)
+
+    def tearDown(self):
+        self.watcher.close()
+        self.file.close()
+        TestLogWatcher.remove_test_files()
+
+    def write_file(self, data):
+        self.file.write(data)
+        self.file.flush()
+
+    def test_lines(self):
+        self.write_file(b'foo\r\nbar\nbaz\n')
+        self.watcher.watch(blocking=False)
+        self.assertEqual(self.lines, [b"foo", b"bar", b"baz"])
+
+    def test_partial_line(self):
+        self.write_file(b'foo\nba')
+        self.watcher.watch(blocking=False)
+        self.assertEqual(self.lines, [b"foo"])
+        self.write_file(b'r\n')
+        self.watcher.watch(blocking=False)
+        self.assertEqual(self.lines, [b"foo", b"bar"])
+
+    def test_truncate(self):
+        self.write_file(b'foo\nba')
+        self.watcher.watch(blocking=False)
+        self.file.truncate(0)
+        self.file.seek(0)
+        self.write_file(b'x\n')
+        self.watcher.watch(blocking=False)
+        self.assertEqual(self.lines, [b"foo", b"x"])
+
+    def test_partial_line_on_unwatch(self):
+        self.write_file(b'foo')
+        os.remove(TESTFN)
+        self.watcher.watch(blocking=False)
+        self.assertEqual(self.lines, [b"foo"])
+
+    def test_tail(self):
+        self.write_file(b'1\n2\n3\n')
+        self.assertEqual(self.watcher._tail(TESTFN, 2), [b"2", b"3"])
+
+
+class TestGlobSpec(TestCase):
+
+    def test_parse(self):
+        spec = GlobSpec.parse('/var/log/*.log;encoding=latin-1;tail=10;'
+                              'all=true;tag=web')
+        self.assertEqual((spec.pattern, spec.encoding, spec.tail_lines,
+                          spec.all_lines, spec.tag),
+                         ('/var/log/*.log', 'latin-1', 10, True, 'web'))
+        spec = GlobSpec.parse('*.log')
+        self.assertEqual((spec.pattern, spec.encoding, spec.tail_lines,
+                          spec.all_lines, spec.tag),
+                         ('*.log', None, None, None, None))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            GlobSpec.parse('*.log;tail')
+        with self.assertRaises(ValueError):
+            GlobSpec.parse('*.log;color=red')
+        with self.assertRaises(ValueError):
+            GlobSpec.from_config({'tag': 'web'})
+
+    def test_with_defaults(self):
+        spec = GlobSpec('*.log', tail_lines=5).with_defaults('UTF-8', False, 10)
+        self.assertEqual((spec.encoding, spec.tail_lines, spec.all_lines),
+                         ('UTF-8', 5, False))
+
+
+class TestMultipleGlobs(TestCase):
+
+    def setUp(self):
+        def callback(filename, lines):
+            self.lines.extend((os.path.basename(filename), line)
+                              for line in lines)
+
+        def tag_cb(filename, tag):
+            self.tags.append((os.path.basename(filename), tag))
+
+        self.dir = tempfile.mkdtemp()
+        self.write('a.log', 'old a\n', 'latin-1')
+        self.write('b.txt', 'old b1\nold b2\n', 'UTF-8')
+        self.lines = []
+        self.tags = []
+        self.watcher = LogWatcher(
+            [GlobSpec(os.path.join(self.dir, '*.log'), encoding='latin-1',
+                      all_lines=True, tag='a'),
+             GlobSpec(os.path.join(self.dir, '*.txt'), tail_lines=1),
+             # matches a.log again, the first spec wins
+             os.path.join(self.dir, 'a.*')],
+            callback, tag_cb=tag_cb, encoding='UTF-8', backend='poll')
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text, encoding):
+        with open(os.path.join(self.dir, name), 'a', encoding=encoding) as f:
+            f.write(text)
+
+    def test_settings(self):
+        self.assertEqual(sorted(self.lines),
+                         [('a.log', 'old a'), ('b.txt', 'old b2')])
+        self.assertEqual(self.tags, [('a.log', 'a')])
+        self.write('a.log', 'gr\xfc\xdfe\n', 'latin-1')
+        self.write('b.txt', 'gr\xfc\xdfe\n', 'UTF-8')
+        self.watcher.watch(blocking=False)
+        self.assertEqual(sorted(self.lines[2:]),
+                         [('a.log', 'gr\xfc\xdfe'), ('b.txt', 'gr\xfc\xdfe')])
+
+
+class TestShardedLogWatcher(TestCase):
+
+    def setUp(self):
+        def callback(filename, lines):
+            self.threads.add(threading.get_ident())
+            self.lines.extend(lines)
+            if len(self.lines) >= len(self.names):
+                self.watcher.stop()
+
+        self.dir = tempfile.mkdtemp()
+        self.names = [os.path.join(self.dir, '{}.log'.format(i))
+                      for i in range(8)]
+        for name in self.names:
+            open(name, 'w').close()
+        self.lines = []
+        self.threads = set()
+        self.watcher = ShardedLogWatcher(os.path.join(self.dir, '*.log'),
+                                         callback, shards=3, backend='poll')
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.dir)
+
+    def write_files(self):
+        for i, name in enumerate(self.names):
+            with open(name, 'a') as f:
+                f.write('{}\n'.format(i))
+
+    def test_distribution(self):
+        files = [stats['files'] for stats in self.watcher.shard_stats()]
+        self.assertEqual(sum(files), len(self.names))
+        self.assertEqual(len(self.watcher.poll_state()), len(self.names))
+
+    def test_non_blocking(self):
+        self.write_files()
+        self.watcher.watch(blocking=False)
+        self.assertEqual(sorted(self.lines), [str(i) for i in range(8)])
+
+    def test_blocking(self):
+        timer = threading.Timer(0.1, self.write_files)
+        timer.start()
+        self.watcher.watch(interval=0.01)
+        timer.join()
+        self.assertEqual(sorted(self.lines), [str(i) for i in range(8)])
+        # the handler is only called by the watching thread
+        self.assertEqual(self.threads, {threading.get_ident()})
+        stats = self.watcher.shard_stats()
+        self.assertEqual(sum(s['lines'] for s in stats), len(self.names))
+
+    def test_reader_error(self):
+        def fail(*args, **kwargs):
+            raise IOError('read error')
+
+        self.watcher._shards[0].watch = fail
+        with self.assertRaises(IOError):
+            self.watcher.watch(interval=0.01)
+
+
+class TestGlobScanner(TestCase):
+
+    def setUp(self):
+        self.dir = os.path.realpath(tempfile.mkdtemp())
+        for name in ('a/x.log', 'a/.x.log', 'a/y.txt', 'b/x2.log', 'c.log'):
+            self.touch(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def touch(self, name):
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+
+    def scan(self, scanner):
+        return sorted(os.path.relpath(p, self.dir) for p in scanner.scan())
+
+    def test_scan(self):
+        scanner = _GlobScanner(os.path.join(self.dir, '*', 'x*.log'))
+        self.assertEqual(self.scan(scanner),
+                         [os.path.join('a', 'x.log'), os.path.join('b', 'x2.log')])
+        scanner = _GlobScanner(os.path.join(self.dir, 'a', '.*.log'))
+        self.assertEqual(self.scan(scanner), [os.path.join('a', '.x.log')])
+
+    def test_cached_listing(self):
+        scanner = _GlobScanner(os.path.join(self.dir, 'a', '*.log'))
+        past = time.time() - 60
+        os.utime(os.path.join(self.dir, 'a'), (past, past))
+        self.assertEqual(self.scan(scanner), [os.path.join('a', 'x.log')])
+        with patch('os.scandir', side_effect=AssertionError('not cached')):
+            self.assertEqual(self.scan(scanner), [os.path.join('a', 'x.log')])
+        # modifying the directory invalidates the cached listing
+        self.touch(os.path.join('a', 'z.log'))
+        self.assertEqual(self.scan(scanner), [os.path.join('a', 'x.log'),
+                                              os.path.join('a', 'z.log')])
+
+
+@skipUnless(inotify.is_available(), "inotify is not available")
+class TestLogWatcherInotify(TestLogWatcher):
+
+    backend = 'inotify'
+
+    def test_blocking_watch(self):
+        def callback(filename, lines):
+            self.lines.extend(lines)
+            if 'bar' in lines:
+                self.watcher.stop()
+
+        self.watcher._lines_cb = callback
+        timer = threading.Timer(0.2, self.write_file, args=('foo\nbar\n',))
+        timer.start()
+        self.watcher.watch(interval=0.1)
+        timer.join()
+        self.assertEqual(self.lines, ["foo", "bar"])
+
+    def test_fallback_scan(self):
+        def callback(filename, lines):
+            self.lines.extend(lines)
+            watcher.stop()
+
+        watcher = LogWatcher('./*', callback, backend=self.backend,
+                             fallback_interval=0.05)
+        try:
+            # simulate a file system, which does not report changes
+            watcher._inotify.read_events = lambda timeout: []
+            timer = threading.Timer(0.2, self.write_file, args=('foo\n',))
+            timer.start()
+            watcher.watch(interval=0.01)
+            timer.join()
+        finally:
+            watcher.close()
+        self.assertEqual(self.lines, ["foo"])
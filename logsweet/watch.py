@@ -11,26 +11,273 @@ Real-time text file watcher supporting log rotation.
 .. _577968: https://github.com/ActiveState/code/tree/master/recipes/Python/577968_Log_watcher_tail_F_log/
 """
 
-from typing import Any, Optional, Callable, Union, Sequence
+from typing import Any, Mapping, Optional, Callable, Union, Sequence
 import os
+import mmap
 import time
 import errno
 import stat
 import glob
+import fnmatch
 import codecs
 import locale
+import zlib
+from queue import Queue, Empty
+from threading import Thread
+from . import inotify
 from .signals import is_stopped
+from .checkpoint import CheckpointStore
+
+BACKENDS = ('auto', 'inotify', 'poll')
+
+
+class _WatchedFile(object):
+    """
+    An open file being watched, together with its reading state.
+    """
+
+    __slots__ = ('name', 'handle', 'fid', 'spec', 'partial',
+                 'size', 'mtime', 'interval', 'next_check')
+
+    def __init__(self, name, handle, fid=None, spec=None):
+        self.name = name
+        self.handle = handle
+        self.fid = fid
+        # the glob spec, which matched the file
+        self.spec = spec
+        # an incomplete trailing line, only used in binary mode
+        self.partial = b''
+        # the state of the adaptive polling
+        self.size = -1
+        self.mtime = None
+        self.interval = 0.0
+        self.next_check = 0.0
+
+
+class GlobSpec(object):
+    """
+    A glob pattern for :py:class:`LogWatcher` with its own settings.
+    Settings which are `None` default to the arguments of the watcher.
+
+    :param pattern:
+        A Unix shell style globbing pattern for the files to watch.
+    :type pattern: str
+
+    :param encoding:
+        The name of a character encoding to decode the matching files.
+    :type encoding: Optional[str]
+
+    :param all_lines:
+        Read all existing lines of the matching files before
+        starting to watch new lines.
+    :type all_lines: Optional[bool]
+
+    :param tail_lines:
+        Read the last N lines of the matching files before starting.
+    :type tail_lines: Optional[int]
+
+    :param tag:
+        A tag for the matching files, which is passed to the handler.
+        :py:class:`logsweet.core.LogWatcherHandler` sends the lines
+        with the tag as source name.
+    :type tag: Optional[str]
+    """
+
+    def __init__(self, pattern: str,
+                 encoding: Optional[str] = None,
+                 all_lines: Optional[bool] = None,
+                 tail_lines: Optional[int] = None,
+                 tag: Optional[str] = None):
+        self.pattern = pattern
+        self.encoding = encoding
+        self.all_lines = all_lines
+        self.tail_lines = tail_lines
+        self.tag = tag
+
+    def __repr__(self):
+        return 'GlobSpec({!r}, encoding={!r}, all_lines={!r}, ' \
+               'tail_lines={!r}, tag={!r})'.format(
+                   self.pattern, self.encoding, self.all_lines,
+                   self.tail_lines, self.tag)
+
+    @classmethod
+    def parse(cls, text: str) -> 'GlobSpec':
+        """
+        Parses a glob spec from a string like
+        ``/var/log/nginx/*.log;encoding=latin-1;tail=10;tag=nginx``.
+        The pattern can be followed by the settings
+        ``encoding``, ``tail``, ``all``, and ``tag``,
+        each separated by a semicolon.
+        """
+        pattern, *settings = text.split(';')
+        config = {'glob': pattern}
+        for setting in settings:
+            key, sep, value = setting.partition('=')
+            if not sep:
+                raise ValueError("Invalid glob setting: " + setting)
+            config[key.strip()] = value.strip()
+        return cls.from_config(config)
+
+    @classmethod
+    def from_config(cls, config: Union[str, Mapping[str, Any]]) -> 'GlobSpec':
+        """
+        Creates a glob spec from a string with a pattern,
+        or from a dict like structure with the keys
+        ``glob``, and optionally ``encoding``, ``tail``, ``all``,
+        and ``tag``.
+        """
+        if isinstance(config, str):
+            return cls(config)
+        unknown = set(config) - {'glob', 'encoding', 'tail', 'all', 'tag'}
+        if unknown:
+            raise ValueError("Unsupported glob settings: " +
+                             ', '.join(sorted(unknown)))
+        if not config.get('glob'):
+            raise ValueError("A glob pattern is required.")
+        all_lines = config.get('all')
+        if isinstance(all_lines, str):
+            all_lines = all_lines.lower() in ('1', 'true', 'yes', 'on')
+        tail_lines = config.get('tail')
+        return cls(config['glob'],
+                   encoding=config.get('encoding'),
+                   all_lines=all_lines,
+                   tail_lines=int(tail_lines) if tail_lines is not None else None,
+                   tag=config.get('tag'))
+
+    def with_defaults(self, encoding: Optional[str] = None,
+                      all_lines: bool = False,
+                      tail_lines: int = 0) -> 'GlobSpec':
+        """
+        Returns a copy, with the unspecified settings replaced by defaults.
+        """
+        return GlobSpec(
+            self.pattern,
+            encoding=self.encoding if self.encoding is not None else encoding,
+            all_lines=self.all_lines if self.all_lines is not None else all_lines,
+            tail_lines=self.tail_lines if self.tail_lines is not None else tail_lines,
+            tag=self.tag)
+
+
+def glob_specs(file_glob: Union[str, GlobSpec, Sequence[Union[str, GlobSpec]]]):
+    """
+    Converts one or multiple glob patterns or glob specs
+    into a list of :py:class:`GlobSpec`.
+    """
+    if isinstance(file_glob, (str, GlobSpec)):
+        file_glob = [file_glob]
+    return [g if isinstance(g, GlobSpec) else GlobSpec(g) for g in file_glob]
+
+
+class _GlobScanner(object):
+    """
+    Finds the regular files matching a glob pattern.
+
+    The pattern is split into directory levels like ``glob.glob()`` does,
+    and the matches in a directory are cached together with
+    the modification time of the directory.
+    A directory is only listed again with ``os.scandir()``,
+    and its matching files are only resolved and stat-ed again,
+    if its modification time changed.
+    Directories modified in the last seconds are always listed,
+    because of the coarse time resolution of some file systems.
+    """
+
+    _SETTLE_TIME = 2.0
+
+    def __init__(self, file_glob):
+        self._file_glob = file_glob
+        self._cache = {}
+
+    def _listing(self, dir_name, pattern, dirs_only):
+        """
+        Returns a dict with the real paths and the stat results of
+        the entries of a directory, matching a pattern.
+        """
+        key = (dir_name, pattern, dirs_only)
+        try:
+            mtime = os.stat(dir_name).st_mtime
+        except EnvironmentError as err:
+            if err.errno not in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                raise
+            self._cache.pop(key, None)
+            return {}
+        cached = self._cache.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        matches = {}
+        real_dir = os.path.realpath(dir_name)
+        include_hidden = pattern.startswith('.')
+        try:
+            with os.scandir(dir_name) as it:
+                for entry in it:
+                    name = entry.name
+                    if name.startswith('.') and not include_hidden:
+                        continue
+                    if not fnmatch.fnmatch(name, pattern):
+                        continue
+                    try:
+                        if dirs_only:
+                            if not entry.is_dir():
+                                continue
+                            matches[entry.path] = None
+                            continue
+                        st = entry.stat()
+                    except EnvironmentError as err:
+                        if err.errno != errno.ENOENT:
+                            raise
+                        continue
+                    if not stat.S_ISREG(st.st_mode):
+                        continue
+                    path = os.path.realpath(entry.path) \
+                        if entry.is_symlink() else os.path.join(real_dir, name)
+                    matches[path] = st
+        except EnvironmentError as err:
+            if err.errno not in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                raise
+            return {}
+        if time.time() - mtime > self._SETTLE_TIME:
+            self._cache[key] = (mtime, matches)
+        else:
+            self._cache.pop(key, None)
+        return matches
+
+    def _directories(self, dir_glob):
+        if not glob.has_magic(dir_glob):
+            return [dir_glob or os.curdir]
+        parent, pattern = os.path.split(dir_glob)
+        if parent == dir_glob:
+            return [dir_glob]
+        dirs = []
+        for dir_name in self._directories(parent):
+            dirs.extend(self._listing(dir_name, pattern, True))
+        return dirs
+
+    def scan(self):
+        """
+        Returns a dict with the real paths and the stat results
+        of all matching regular files.
+        """
+        dir_glob, pattern = os.path.split(self._file_glob)
+        files = {}
+        for dir_name in self._directories(dir_glob):
+            files.update(self._listing(dir_name, pattern, False))
+        return files
 
 
 class LogWatcher(object):
     """
-    Looks for changes in all files matching a glob pattern.
+    Looks for changes in all files matching one or more glob patterns.
     This is useful for watching log file changes in real-time.
     It also supports files rotation.
 
     :param file_glob:
-        A Unix shell style globbing pattern for the files to watch.
-    :type file_glob: str
+        A Unix shell style globbing pattern for the files to watch,
+        or a :py:class:`GlobSpec` with its own settings,
+        or a sequence of them.
+        All patterns share the same loop.
+        A file matching multiple patterns is watched with the settings
+        of the first one.
+    :type file_glob: Union[str, GlobSpec, Sequence[Union[str, GlobSpec]]]
 
     :param handler:
         A function which is called every time one of the files being
@@ -38,8 +285,10 @@ class LogWatcher(object):
         this is called with `filename` and `lines` arguments.
 
         Alternatively an object with a method ``notify_lines(filename, lines)``
-        and optionally the methods ``notify_watch(filename)`` and
-        ``notify_unwatch(filename)``.
+        and optionally the methods ``notify_watch(filename)``,
+        ``notify_unwatch(filename)``, ``notify_truncate(filename)``,
+        and ``notify_flush()``;
+        the latter is called after every iteration of :py:meth:`watch`.
     :type handler: Union[Callable[[str, Sequence[str]], None], Any]
 
     :param watch_cb:
@@ -54,13 +303,44 @@ class LogWatcher(object):
         this is called with a `filename` argument.
     :type unwatch_cb: Optional[Callable[[str], None]]
 
+    :param truncate_cb:
+        A function which is called every time a watched file
+        was truncated, e.g. by a log rotation with ``copytruncate``,
+        before the file is read again from the beginning;
+        this is called with a `filename` argument.
+        A file is considered truncated, if its size is smaller
+        than the offset up to which it has been read.
+    :type truncate_cb: Optional[Callable[[str], None]]
+
+    :param tag_cb:
+        A function which is called every time a file, which matched
+        a :py:class:`GlobSpec` with a tag, joins the set of watched files,
+        before `watch_cb`;
+        this is called with `filename` and `tag` arguments.
+        A handler object can provide the method
+        ``notify_tag(filename, tag)`` instead.
+    :type tag_cb: Optional[Callable[[str, str], None]]
+
+    :param shard_index:
+        The index of the shard of files to watch, see `shard_count`.
+    :type shard_index: int
+
+    :param shard_count:
+        The number of shards the matching files are distributed over.
+        If greater than 1, only the files whose id hashes to
+        `shard_index` are watched.
+        See :py:class:`ShardedLogWatcher`.
+    :type shard_count: int
+
     :param all_lines:
         Read all existing lines before starting to watch new lines.
         Ignores `tail_lines`.
+        The default for glob specs without this setting.
     :type all_lines: bool
 
     :param tail_lines:
         Read last N lines from files being watched before starting.
+        The default for glob specs without this setting.
     :type tail_lines: int
 
     :param chunk_size:
@@ -74,8 +354,63 @@ class LogWatcher(object):
     :param encoding:
         The name of a character encoding to decode the text files.
         If `None` defaults to ``locale.getpreferredencoding()``.
+        The default for glob specs without this setting.
+        Ignored in binary mode.
     :type encoding: Optional[str]
 
+    :param backend:
+        The mechanism to detect changes in the watched files.
+        ``inotify`` blocks until the watched directories report changes
+        and reads only the files, which actually changed.
+        ``poll`` checks the size and modification time of the files,
+        and reads the files which changed.
+        Files which did not change are checked less often,
+        doubling the interval up to `max_poll_interval`.
+        ``auto`` uses ``inotify`` if available and ``poll`` otherwise.
+        inotify does not report changes made by other hosts
+        on network file systems like NFS or CIFS,
+        therefore the ``inotify`` backend additionally
+        rescans the directories and reads all files
+        every `fallback_interval` seconds.
+    :type backend: str
+
+    :param binary:
+        Read the files as raw bytes and pass the lines as `bytes`
+        to the handler, without decoding them.
+        In binary mode, an incomplete trailing line is held back
+        until it is terminated by a newline,
+        or until the file leaves the set of watched files.
+    :type binary: bool
+
+    :param fallback_interval:
+        The interval in seconds for rescanning and reading all files
+        with the ``inotify`` backend, to catch changes which are
+        not reported by inotify. ``0`` disables the fallback.
+        Ignored by the ``poll`` backend.
+    :type fallback_interval: float
+
+    :param max_poll_interval:
+        The maximum interval in seconds for checking idle files
+        with the ``poll`` backend.
+        Files which changed are checked in every iteration.
+    :type max_poll_interval: float
+
+    :param rescan_interval:
+        The minimal interval in seconds between two searches for new,
+        removed, or rotated files with the ``poll`` backend;
+        the watched files are read in every iteration of :py:meth:`watch`.
+        The directories are scanned incrementally, see above.
+    :type rescan_interval: float
+
+    :param checkpoint:
+        A store for the read offsets of the files.
+        If the store was loaded from an existing file,
+        known files are read from the recorded offset,
+        and unknown files, which were created while no watcher was running,
+        are read from the beginning;
+        `all_lines` and `tail_lines` are ignored in this case.
+    :type checkpoint: Optional[logsweet.checkpoint.CheckpointStore]
+
     Example:
 
     ::
@@ -88,46 +423,88 @@ class LogWatcher(object):
         lw.watch()
     """
 
-    def __init__(self, file_glob: str,
+    def __init__(self, file_glob: Union[str, GlobSpec, Sequence[Union[str, GlobSpec]]],
                  handler: Union[Callable[[str, Sequence[str]], None], Any],
                  watch_cb: Optional[Callable[[str], None]] = None,
                  unwatch_cb: Optional[Callable[[str], None]] = None,
                  all_lines: bool = False,
                  tail_lines: int = 0,
                  chunk_size: int = 1048576,
-                 encoding: Optional[str] = None):
-        self._file_glob = file_glob
+                 encoding: Optional[str] = None,
+                 backend: str = 'auto',
+                 binary: bool = False,
+                 fallback_interval: float = 5.0,
+                 rescan_interval: float = 1.0,
+                 max_poll_interval: float = 1.0,
+                 checkpoint: Optional[CheckpointStore] = None,
+                 truncate_cb: Optional[Callable[[str], None]] = None,
+                 shard_index: int = 0,
+                 shard_count: int = 1,
+                 tag_cb: Optional[Callable[[str, str], None]] = None):
+        self._specs = [spec.with_defaults(encoding, all_lines, tail_lines)
+                       for spec in glob_specs(file_glob)]
+        if not self._specs:
+            raise ValueError("At least one glob pattern is required.")
+        self._scanners = [_GlobScanner(spec.pattern) for spec in self._specs]
         self._files_map = {}
+        self._names_map = {}
+        self._inotify = None
+        if backend not in BACKENDS:
+            raise ValueError("Unsupported watch backend: " + str(backend))
+        if backend == 'inotify' and not inotify.is_available():
+            raise ValueError("The inotify backend is not available.")
+        if backend != 'poll' and inotify.is_available():
+            self._inotify = inotify.Inotify()
         if hasattr(handler, 'notify_lines') and callable(getattr(handler, 'notify_lines')):
             # treat handler as an object with notify_* methods
             self._lines_cb = handler.notify_lines
             self._watch_cb = getattr(handler, 'notify_watch', watch_cb)
             self._unwatch_cb = getattr(handler, 'notify_unwatch', unwatch_cb)
+            self._truncate_cb = getattr(handler, 'notify_truncate', truncate_cb)
+            self._tag_cb = getattr(handler, 'notify_tag', tag_cb)
+            self._flush_cb = getattr(handler, 'notify_flush', None)
         else:
             # otherwise treat it as the handler function for lines
             self._lines_cb = handler
             self._watch_cb = watch_cb
             self._unwatch_cb = unwatch_cb
-        self._all_lines = all_lines
-        self._tail_lines = tail_lines
+            self._truncate_cb = truncate_cb
+            self._tag_cb = tag_cb
+            self._flush_cb = None
         self._size_hint = chunk_size
         self._encoding = encoding
+        self._binary = binary
+        self._buffer = bytearray(chunk_size) if binary else None
+        self._stopped = False
+        self._fallback_interval = fallback_interval
+        self._checkpoint = checkpoint
+        self._rescan_interval = rescan_interval
+        self._max_poll_interval = max_poll_interval
+        self._shard_index = shard_index
+        self._shard_count = max(1, shard_count)
+        self._last_scan = 0.0
         self.verbose = False
         self._update_files()
         for _, file in self._files_map.items():
-            if self._all_lines:
+            if checkpoint is not None and checkpoint.existed:
+                offset = checkpoint.resume_offset(file.fid, file.name)
+                file.handle.seek(offset or 0)
+                self._read_lines(file)
+            elif file.spec.all_lines:
                 self._read_lines(file)
             else:
-                if self._tail_lines:
+                if file.spec.tail_lines:
                     try:
-                        lines = self._tail(file.name, self._tail_lines)
+                        lines = self._tail(file.name, file.spec.tail_lines,
+                                           file.spec.encoding)
                     except IOError as err:
                         if err.errno != errno.ENOENT:
                             raise
                     else:
                         if lines:
                             self._lines_cb(file.name, lines)
-                file.seek(os.path.getsize(file.name))  # EOF
+                file.handle.seek(os.path.getsize(file.name))  # EOF
+                self._save_checkpoint(file, 0)
 
     def __enter__(self):
         return self
@@ -148,42 +525,228 @@ class LogWatcher(object):
 
         :param interval:
             The polling interval in seconds.
+            If the ``inotify`` backend is used,
+            this is the timeout for handling possible interruption.
         :type interval: float
         :param blocking:
-            If `True` is given, performs only one loop and then returns.
+            If `False` is given, performs only one loop and then returns.
+            A non-blocking call always searches for new files.
         :type blocking: bool
         """
+        if self._inotify:
+            self._watch_events(interval, blocking)
+            return
 
-        # May be overridden in order to use pyinotify lib and block
-        # until the directory being watched is updated.
-
-        # Note that directly calling _read_lines() as we do is faster
-        # than first checking file's last modification times.
         while True:
-            self._update_files()
+            if not blocking or time.monotonic() - self._last_scan \
+                    >= self._rescan_interval:
+                self._update_files()
+                self._last_scan = time.monotonic()
+            now = time.monotonic()
             for fid, file in list(self._files_map.items()):
-                self._read_lines(file)
-            if not blocking or is_stopped():
+                if not blocking or now >= file.next_check:
+                    self._poll_file(file, now, interval)
+            if callable(self._flush_cb):
+                self._flush_cb()
+            if not blocking or self._stopped or is_stopped():
                 return
             time.sleep(interval)
 
-    def _open(self, file):
+    def _has_changed(self, file):
+        """
+        Checks the size and the modification time of an open file,
+        and remembers them for the next check.
+        Rewinds the file, if it was truncated.
+        """
+        try:
+            st = os.fstat(file.handle.fileno())
+        except (EnvironmentError, ValueError):
+            return True
+        if st.st_size == file.size and st.st_mtime == file.mtime:
+            return False
+        file.size = st.st_size
+        file.mtime = st.st_mtime
+        if st.st_size < self._offset(file):
+            self._rewind(file)
+        return True
+
+    def _rewind(self, file):
+        """
+        Continues reading a truncated file from the beginning.
+        An incomplete trailing line from before the truncation is dropped.
+        """
+        file.handle.seek(0)
+        file.partial = b''
+        self._save_checkpoint(file, 0)
+        if callable(self._truncate_cb):
+            self._truncate_cb(file.name)
+
+    def _poll_file(self, file, now, interval):
         """
-        Opens a file in text mode.
+        Reads a file if it changed, and schedules the next check:
+        in the next iteration if it changed,
+        otherwise after twice the last interval.
         """
-        encoding = self._encoding or locale.getpreferredencoding()
+        if self._has_changed(file):
+            self._read_lines(file)
+            file.interval = 0.0
+        else:
+            file.interval = min(self._max_poll_interval,
+                                max(interval, file.interval * 2))
+        file.next_check = now + file.interval
+
+    def poll_state(self):
+        """
+        Returns the state of the adaptive polling for debugging.
+
+        :return:
+            A dict with the file names as keys, and dicts with the
+            last seen `size` and `mtime`, the current check `interval`,
+            and the seconds until the next check `due` as values.
+        """
+        now = time.monotonic()
+        return {file.name: {'size': file.size, 'mtime': file.mtime,
+                            'interval': file.interval,
+                            'due': max(0.0, file.next_check - now)}
+                for file in list(self._files_map.values())}
+
+    def stop(self):
+        """
+        Stops a blocking call to :py:meth:`watch` after the current iteration.
+        Can be called from a handler or another thread.
+        """
+        self._stopped = True
+
+    def _read_all(self):
+        self._update_files()
+        for fid, file in list(self._files_map.items()):
+            if self._has_changed(file):
+                self._read_lines(file)
+
+    def _watch_events(self, interval, blocking):
+        self._read_all()
+        if callable(self._flush_cb):
+            self._flush_cb()
+        if not blocking:
+            return
+        last_scan = time.monotonic()
+        while not self._stopped and not is_stopped():
+            events = self._inotify.read_events(interval)
+            if events:
+                self._handle_events(events)
+            if self._fallback_interval and \
+                    time.monotonic() - last_scan >= self._fallback_interval:
+                # catch changes not reported by inotify, e.g. on NFS
+                self._read_all()
+                last_scan = time.monotonic()
+            if callable(self._flush_cb):
+                self._flush_cb()
+
+    def _handle_events(self, events):
+        rescan = False
+        changed = set()
+        for path, mask in events:
+            if path is None:
+                # event queue overflow, changes may got lost
+                rescan = True
+                changed.update(self._names_map.keys())
+                continue
+            if mask & inotify.IN_MODIFY:
+                changed.add(path)
+            else:
+                rescan = True
+        if rescan:
+            self._update_files()
+        for file_name in changed:
+            fid = self._names_map.get(file_name)
+            if fid in self._files_map:
+                file = self._files_map[fid]
+                if self._has_changed(file):
+                    self._read_lines(file)
+
+    def _watch_directories(self):
+        """
+        Adds inotify watches for the directories,
+        which can contain files matching the glob patterns.
+        """
+        for spec in self._specs:
+            dir_glob = os.path.dirname(spec.pattern) or os.curdir
+            if glob.has_magic(dir_glob):
+                base = dir_glob
+                while glob.has_magic(base):
+                    base = os.path.dirname(base) or os.curdir
+                dirs = [base] + list(glob.iglob(dir_glob))
+            else:
+                dirs = [dir_glob]
+            for dir_name in dirs:
+                dir_name = os.path.realpath(dir_name)
+                if not self._inotify.is_watching(dir_name):
+                    self._inotify.add_watch(dir_name)
+
+    def _open(self, file, encoding=None):
+        """
+        Opens a file in text mode, or unbuffered in binary mode.
+        """
+        if self._binary:
+            return open(file, 'rb', buffering=0)
+        encoding = encoding or self._encoding or locale.getpreferredencoding()
         return codecs.open(file, 'r', encoding=encoding, errors='ignore')
 
-    def _tail(self, file_name, line_number):
+    def _tail(self, file_name, line_number, encoding=None):
         """
         Read last N lines from file file_name.
+
+        Scans the raw bytes of the memory mapped file backwards
+        for the start of the last N lines, and decodes only them.
         """
         if line_number < 0:
             raise ValueError("line_number must be greater or equal then 0")
         if line_number == 0:
             return []
+        encoding = encoding or self._encoding or locale.getpreferredencoding()
+        if not self._binary and not self._is_ascii_compatible(encoding):
+            return self._tail_text(file_name, line_number, encoding)
 
-        with self._open(file_name) as f:
+        with open(file_name, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return []
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # e.g. a special file, which can not be mapped
+                return self._tail_text(file_name, line_number, encoding)
+            with data:
+                end = len(data)
+                # a terminating line break does not start another line
+                pos = end - 1 if data[end - 1:end] == b'\n' else end
+                for _ in range(line_number):
+                    pos = data.rfind(b'\n', 0, pos)
+                    if pos < 0:
+                        break
+                tail = data[pos + 1:end]
+        if not self._binary:
+            tail = tail.decode(encoding, errors='ignore')
+        return tail.splitlines()[-line_number:]
+
+    @staticmethod
+    def _is_ascii_compatible(encoding):
+        """
+        Checks whether a line break is encoded as a single ``\\n`` byte,
+        so the raw bytes can be scanned for line breaks.
+        """
+        try:
+            return '\n'.encode(encoding) == b'\n'
+        except LookupError:
+            return False
+
+    def _tail_text(self, file_name, line_number, encoding=None):
+        """
+        Read last N lines from file file_name,
+        reading blocks backwards in text mode.
+        Used for encodings, which are not compatible to ASCII.
+        """
+        with self._open(file_name, encoding) as f:
             buffer_size = 1024
             # True if open() was overridden and file was opened in text
             # mode. In that case readlines() will return unicode strings
@@ -211,65 +774,141 @@ class LogWatcher(object):
                     block -= 1
             return data.splitlines()[-line_number:]
 
-    def _check_existing_files(self):
+    def _check_existing_files(self, matches):
         for fid, file in list(self._files_map.items()):
-            try:
-                st = os.stat(file.name)
-            except EnvironmentError as err:
-                if err.errno == errno.ENOENT:
-                    self._unwatch(file, fid)
-                else:
-                    raise
-            else:
-                if fid != self._get_file_id(st):
-                    # same name but different file (rotation); reload it.
-                    self._unwatch(file, fid)
-                    self._watch(file.name)
-
-    def _find_new_files(self):
-        ls = []
-        for name in glob.iglob(self._file_glob):
-            absname = os.path.realpath(name)
-            try:
-                st = os.stat(absname)
-            except EnvironmentError as err:
-                if err.errno != errno.ENOENT:
+            st, _ = matches.get(file.name, (None, None))
+            if st is None:
+                # not found by the scan, e.g. the real path of a symlink
+                # lies outside of the scanned directories
+                try:
+                    st = os.stat(file.name)
+                except EnvironmentError as err:
+                    if err.errno == errno.ENOENT:
+                        self._unwatch(file, fid)
+                        continue
                     raise
-            else:
-                if not stat.S_ISREG(st.st_mode):
-                    continue
-                fid = self._get_file_id(st)
-                ls.append((fid, absname))
+            if fid != self._get_file_id(st):
+                # same name but different file (rotation); reload it.
+                self._unwatch(file, fid)
+                if self._is_own(st):
+                    self._watch(file.name, file.spec)
+
+    def _find_new_files(self, matches):
+        for file_name, (st, spec) in matches.items():
+            if self._get_file_id(st) not in self._files_map \
+                    and self._is_own(st):
+                self._watch(file_name, spec)
 
-        for fid, file_name in ls:
-            if fid not in self._files_map:
-                self._watch(file_name)
+    def _is_own(self, st):
+        """
+        Checks whether a file belongs to the shard of this watcher.
+        """
+        if self._shard_count == 1:
+            return True
+        fid = self._get_file_id(st)
+        return zlib.crc32(fid.encode()) % self._shard_count \
+            == self._shard_index
 
     def _update_files(self):
-        self._check_existing_files()
-        self._find_new_files()
+        if self._inotify:
+            self._watch_directories()
+        matches = {}
+        for spec, scanner in zip(self._specs, self._scanners):
+            for file_name, st in scanner.scan().items():
+                # the first matching pattern determines the settings
+                if file_name not in matches:
+                    matches[file_name] = (st, spec)
+        self._check_existing_files(matches)
+        self._find_new_files(matches)
 
     def _read_lines(self, file):
         """
         Read file lines since last access until EOF is reached and
         invoke callback.
         """
-        while True:
-            lines = file.readlines(self._size_hint)
-            if not lines:
-                break
-            lines = list(map(lambda l: l.rstrip('\r\n'), lines))
-            self._lines_cb(file.name, lines)
+        if self._binary:
+            count = self._read_binary_lines(file)
+        else:
+            count = 0
+            while True:
+                lines = file.handle.readlines(self._size_hint)
+                if not lines:
+                    break
+                lines = [line.rstrip('\r\n') for line in lines]
+                self._lines_cb(file.name, lines)
+                count += len(lines)
+        if count:
+            self._save_checkpoint(file, count)
+
+    def _offset(self, file):
+        """
+        Determines the number of bytes of a file,
+        which have been passed to the handler.
+        """
+        offset = file.handle.tell()
+        if self._binary:
+            return offset - len(file.partial)
+        # bytes of an incomplete character buffered by the decoder
+        reader = getattr(file.handle, 'reader', None)
+        return offset - len(getattr(reader, 'bytebuffer', b''))
+
+    def _save_checkpoint(self, file, lines):
+        if self._checkpoint is not None and file.fid is not None:
+            self._checkpoint.update(file.fid, file.name,
+                                    self._offset(file), lines)
+
+    def _read_binary_lines(self, file):
+        """
+        Read raw chunks into the reusable buffer and split them into lines,
+        carrying an incomplete trailing line over to the next read.
+        """
+        buffer = self._buffer
+        view = memoryview(buffer)
+        count = 0
+        try:
+            while True:
+                n = file.handle.readinto(buffer)
+                if not n:
+                    break
+                end = buffer.rfind(b'\n', 0, n)
+                if end < 0:
+                    file.partial += view[:n]
+                else:
+                    data = file.partial + view[:end] \
+                        if file.partial else bytes(view[:end])
+                    file.partial = bytes(view[end + 1:n])
+                    lines = data.split(b'\n')
+                    if b'\r' in data:
+                        lines = [line.rstrip(b'\r') for line in lines]
+                    self._lines_cb(file.name, lines)
+                    count += len(lines)
+                if n < len(buffer):
+                    break
+        finally:
+            view.release()
+        return count
+
+    def _flush_partial_line(self, file):
+        if file.partial:
+            line, file.partial = file.partial.rstrip(b'\r'), b''
+            self._lines_cb(file.name, [line])
 
-    def _watch(self, file_name):
+    def _watch(self, file_name, spec):
         try:
-            file = self._open(file_name)
+            file = _WatchedFile(file_name, self._open(file_name, spec.encoding),
+                                spec=spec)
             fid = self._get_file_id(os.stat(file_name))
         except EnvironmentError as err:
             if err.errno != errno.ENOENT:
                 raise
         else:
+            file.fid = fid
             self._files_map[fid] = file
+            self._names_map[file.name] = fid
+            if self._inotify:
+                self._inotify.add_watch(os.path.dirname(file.name))
+            if spec.tag is not None and callable(self._tag_cb):
+                self._tag_cb(file_name, spec.tag)
             if callable(self._watch_cb):
                 self._watch_cb(file_name)
 
@@ -279,8 +918,13 @@ class LogWatcher(object):
         # file.
         del self._files_map[fid]
         file_name = file.name
-        with file:
+        if self._names_map.get(file_name) == fid:
+            del self._names_map[file_name]
+        with file.handle:
             self._read_lines(file)
+        self._flush_partial_line(file)
+        if self._checkpoint is not None:
+            self._checkpoint.remove(fid)
         if callable(self._unwatch_cb):
             self._unwatch_cb(file_name)
 
@@ -293,5 +937,291 @@ class LogWatcher(object):
 
     def close(self):
         for _, file in self._files_map.items():
-            file.close()
+            file.handle.close()
         self._files_map.clear()
+        self._names_map.clear()
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+
+class _ShardHandler(object):
+    """
+    Passes the events of one shard to a :py:class:`ShardedLogWatcher`.
+    """
+
+    def __init__(self, index, sharded):
+        self._index = index
+        self._sharded = sharded
+
+    def notify_lines(self, file_name, lines):
+        self._sharded._post(self._index, 'lines', file_name, lines)
+
+    def notify_watch(self, file_name):
+        self._sharded._post(self._index, 'watch', file_name)
+
+    def notify_unwatch(self, file_name):
+        self._sharded._post(self._index, 'unwatch', file_name)
+
+    def notify_truncate(self, file_name):
+        self._sharded._post(self._index, 'truncate', file_name)
+
+    def notify_tag(self, file_name, tag):
+        self._sharded._post(self._index, 'tag', file_name, tag)
+
+
+class ShardedLogWatcher(object):
+    """
+    Watches files like :py:class:`LogWatcher`,
+    but distributes the matching files over multiple reader threads,
+    so a slow file or a burst of lines in one file
+    does not delay the lines of the files in the other shards.
+
+    A file is assigned to a shard by a hash of its file id.
+    Every shard is a :py:class:`LogWatcher` with its own thread,
+    which checks, reads, and decodes its files,
+    and passes the lines through a bounded queue
+    to the thread calling :py:meth:`watch`.
+    Only this thread calls the handler,
+    so the handler can own sockets, which are not thread-safe,
+    like ZeroMQ sockets.
+    If the queue is full, the reader threads wait for the handler.
+
+    The read offsets are recorded in the `checkpoint`,
+    when the lines are queued.
+    Lines, which are still queued when the process is killed,
+    are not read again after a restart.
+
+    :param file_glob:
+        One or more glob patterns or glob specs.
+        See :py:class:`LogWatcher`.
+    :type file_glob: Union[str, GlobSpec, Sequence[Union[str, GlobSpec]]]
+
+    :param handler:
+        A function or an object with ``notify_*`` methods.
+        See :py:class:`LogWatcher`.
+    :type handler: Union[Callable[[str, Sequence[str]], None], Any]
+
+    :param watch_cb:
+        See :py:class:`LogWatcher`.
+    :type watch_cb: Optional[Callable[[str], None]]
+
+    :param unwatch_cb:
+        See :py:class:`LogWatcher`.
+    :type unwatch_cb: Optional[Callable[[str], None]]
+
+    :param truncate_cb:
+        See :py:class:`LogWatcher`.
+    :type truncate_cb: Optional[Callable[[str], None]]
+
+    :param tag_cb:
+        See :py:class:`LogWatcher`.
+    :type tag_cb: Optional[Callable[[str, str], None]]
+
+    :param shards:
+        The number of reader threads.
+    :type shards: int
+
+    :param queue_size:
+        The maximum number of queued events,
+        e.g. chunks of lines, from all shards.
+    :type queue_size: int
+
+    :param kwargs:
+        Further keyword arguments for :py:class:`LogWatcher`,
+        e.g. `encoding`, `binary`, `backend`, or `checkpoint`.
+    """
+
+    def __init__(self, file_glob: Union[str, GlobSpec, Sequence[Union[str, GlobSpec]]],
+                 handler: Union[Callable[[str, Sequence[str]], None], Any],
+                 watch_cb: Optional[Callable[[str], None]] = None,
+                 unwatch_cb: Optional[Callable[[str], None]] = None,
+                 truncate_cb: Optional[Callable[[str], None]] = None,
+                 tag_cb: Optional[Callable[[str, str], None]] = None,
+                 shards: int = 2,
+                 queue_size: int = 1000,
+                 **kwargs):
+        if hasattr(handler, 'notify_lines') and callable(getattr(handler, 'notify_lines')):
+            # treat handler as an object with notify_* methods
+            self._callbacks = {
+                'lines': handler.notify_lines,
+                'watch': getattr(handler, 'notify_watch', watch_cb),
+                'unwatch': getattr(handler, 'notify_unwatch', unwatch_cb),
+                'truncate': getattr(handler, 'notify_truncate', truncate_cb),
+                'tag': getattr(handler, 'notify_tag', tag_cb),
+            }
+            self._flush_cb = getattr(handler, 'notify_flush', None)
+        else:
+            # otherwise treat it as the handler function for lines
+            self._callbacks = {
+                'lines': handler,
+                'watch': watch_cb,
+                'unwatch': unwatch_cb,
+                'truncate': truncate_cb,
+                'tag': tag_cb,
+            }
+            self._flush_cb = None
+        shards = max(1, shards)
+        self._queue = Queue(max(1, queue_size))
+        self._threaded = False
+        self._stopped = False
+        self._stats = [{'lines': 0, 'events': 0,
+                        'latency_sum': 0.0, 'latency_max': 0.0}
+                       for _ in range(shards)]
+        self._shards = []
+        try:
+            # the shards are created in this thread,
+            # so initially read lines are passed to the handler directly
+            for i in range(shards):
+                self._shards.append(LogWatcher(
+                    file_glob, _ShardHandler(i, self),
+                    shard_index=i, shard_count=shards, **kwargs))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _post(self, index, kind, *args):
+        event = (index, time.perf_counter(), kind, args)
+        if self._threaded:
+            self._queue.put(event)
+        else:
+            self._handle(event)
+
+    def _handle(self, event):
+        index, posted, kind, args = event
+        if kind == 'error':
+            raise args[0]
+        cb = self._callbacks[kind]
+        if callable(cb):
+            cb(*args)
+        stats = self._stats[index]
+        latency = time.perf_counter() - posted
+        stats['events'] += 1
+        stats['latency_sum'] += latency
+        stats['latency_max'] = max(stats['latency_max'], latency)
+        if kind == 'lines':
+            stats['lines'] += len(args[1])
+
+    def _handle_pending(self, timeout=None):
+        """
+        Handles all queued events,
+        waiting up to `timeout` seconds for the first one.
+        """
+        try:
+            event = self._queue.get(timeout=timeout) \
+                if timeout else self._queue.get_nowait()
+        except Empty:
+            return
+        while True:
+            self._handle(event)
+            try:
+                event = self._queue.get_nowait()
+            except Empty:
+                return
+
+    def _run_shard(self, index, interval):
+        try:
+            self._shards[index].watch(interval=interval)
+        except Exception as e:
+            self._queue.put((index, time.perf_counter(), 'error', (e,)))
+
+    def watch(self, interval: float = 0.1, blocking: bool = True):
+        """
+        Starts the reader threads and passes their lines to the handler,
+        until `Ctrl + C` is pressed, ``SIGINT`` or ``SIGTERM`` is received
+        by the process, or :py:meth:`stop` is called.
+        An exception in a reader thread stops all threads
+        and is raised again.
+
+        :param interval:
+            The polling interval of the shards in seconds,
+            and the timeout for waiting for their lines.
+            See :py:meth:`LogWatcher.watch`.
+        :type interval: float
+        :param blocking:
+            If `False` is given, performs only one loop of every shard
+            in the calling thread and then returns.
+        :type blocking: bool
+        """
+        if not blocking:
+            for shard in self._shards:
+                shard.watch(interval=interval, blocking=False)
+            if callable(self._flush_cb):
+                self._flush_cb()
+            return
+
+        threads = [Thread(target=self._run_shard, args=(i, interval),
+                          name='logsweet-shard-{}'.format(i), daemon=True)
+                   for i in range(len(self._shards))]
+        self._threaded = True
+        for thread in threads:
+            thread.start()
+        try:
+            while not self._stopped and not is_stopped() \
+                    and any(t.is_alive() for t in threads):
+                self._handle_pending(interval)
+                if callable(self._flush_cb):
+                    self._flush_cb()
+        finally:
+            for shard in self._shards:
+                shard.stop()
+            # the reader threads may wait for space in the queue
+            while any(t.is_alive() for t in threads):
+                self._handle_pending(0.01)
+            self._threaded = False
+            self._handle_pending()
+            if callable(self._flush_cb):
+                self._flush_cb()
+
+    def stop(self):
+        """
+        Stops a blocking call to :py:meth:`watch`.
+        Can be called from a handler or another thread.
+        """
+        self._stopped = True
+        for shard in self._shards:
+            shard.stop()
+
+    def poll_state(self):
+        """
+        Returns the state of the adaptive polling of all shards.
+        See :py:meth:`LogWatcher.poll_state`.
+        """
+        state = {}
+        for shard in self._shards:
+            state.update(shard.poll_state())
+        return state
+
+    def shard_stats(self):
+        """
+        Returns statistics for every shard.
+
+        :return:
+            A list with a dict for every shard,
+            with the number of watched `files`,
+            the number of handled `lines` and `events`,
+            and the average and maximum time in seconds
+            from reading the lines until the handler returned
+            (`latency_avg` and `latency_max`).
+        """
+        result = []
+        for shard, stats in zip(self._shards, self._stats):
+            events = stats['events']
+            result.append({
+                'files': len(shard._files_map),
+                'lines': stats['lines'],
+                'events': events,
+                'latency_avg': stats['latency_sum'] / events if events else 0.0,
+                'latency_max': stats['latency_max'],
+            })
+        return result
+
+    def close(self):
+        for shard in self._shards:
+            shard.close()